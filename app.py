@@ -1,6 +1,7 @@
 import streamlit as st
 from app import init_app
-from app.pages import overview, reports, production, sales, products, customers
+from app.database.connection import get_pool_stats, page_session
+from app.pages.registry import PAGES, load_page, page_icon
 
 # Configure the Streamlit page
 st.set_page_config(
@@ -17,26 +18,18 @@ def main():
     # Sidebar navigation
     st.sidebar.title("Navigation")
     
-    # Navigation options with icons
-    pages = {
-        "Overview": {"icon": "📊", "module": overview},
-        "Reports": {"icon": "📈", "module": reports},
-        "Production": {"icon": "🏭", "module": production},
-        "Orders": {"icon": "💰", "module": sales},
-        "Products": {"icon": "📦", "module": products},
-        "Customers": {"icon": "👥", "module": customers}
-    }
-    
-    # Create selection box with icons
+    # Create selection box with icons; page modules are imported when first selected
     selection = st.sidebar.selectbox(
         "",
-        options=list(pages.keys()),
-        format_func=lambda x: f"{pages[x]['icon']} {x}"
+        options=list(PAGES.keys()),
+        format_func=lambda x: f"{page_icon(x)} {x}"
     )
     
-    # Render the selected page
+    # Render the selected page with a session that is returned to the pool afterwards
     try:
-        pages[selection]['module'].show()
+        page = load_page(selection)
+        with page_session():
+            page.show()
     except Exception as e:
         st.error(f"Error loading page: {str(e)}")
         st.write("Please make sure all required page modules are implemented.")
@@ -45,6 +38,12 @@ def main():
     st.sidebar.markdown("---")
     st.sidebar.markdown("### About")
     st.sidebar.markdown("v1.0.0")
+    pool = get_pool_stats()
+    st.sidebar.caption(
+        f"Database connections: {pool['checked_out']} in use of {pool['pool_size']} "
+        f"(+{max(pool['overflow'], 0)} overflow), average wait {pool['avg_wait'] * 1000:.0f} ms, "
+        f"{pool['slow_checkouts']} slow"
+    )
     st.sidebar.markdown("© 2025 Brewery Inventory System")
 
 if __name__ == "__main__":
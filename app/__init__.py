@@ -1,5 +1,7 @@
 from app.database.connection import init_db
+from app.database.invalidation import start_cache_listener
 
 def init_app():
     """Initialize the application"""
-    init_db()
\ No newline at end of file
+    init_db()
+    start_cache_listener()
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""Aggregate tables derived from orders and production, kept current by the write paths
+
+Order writes call add_sales_to_aggregates() after inserting or updating
+sales rows and remove_sales_from_aggregates() before updating or deleting
+them, inside the same transaction; production writes do the same with
+add_production_to_aggregates() and remove_production_from_aggregates().
+Each call applies the rows as a signed delta, so the aggregates never need
+to be recomputed from history. The same hooks keep the stock ledger and
+balances of app.database.stock current.
+
+Usage:
+    python -m app.database.aggregates --rebuild       # recompute from scratch
+    python -m app.database.aggregates --allocations   # re-allocate orders to batches
+"""
+import argparse
+import sys
+from sqlalchemy import text
+from app.database.batches import rebuild_allocations
+from app.database.stock import apply_stock_movements, rebuild_stock
+
+# Products re-allocated per transaction by --allocations
+ALLOCATION_CHUNK = 100
+
+def _apply_sales_delta(db, sale_ids, sign):
+    """Add (sign=1) or subtract (sign=-1) sales rows from the aggregates"""
+    db.execute(text("""
+        INSERT INTO sales_daily_agg AS agg
+            (sale_day, product_id, customer_id, category,
+             order_lines, quantity, revenue, cogs)
+        SELECT
+            s.sale_date::date,
+            s.product_id,
+            COALESCE(s.customer_id, 0),
+            p.category,
+            :sign * COUNT(*),
+            :sign * SUM(s.quantity),
+            :sign * SUM(s.quantity * s.price_per_unit),
+            :sign * SUM(s.quantity * COALESCE(p.base_price, 0))
+        FROM sales s
+        JOIN products p ON s.product_id = p.id
+        WHERE s.id = ANY(:sale_ids)
+        GROUP BY s.sale_date::date, s.product_id, COALESCE(s.customer_id, 0), p.category
+        ON CONFLICT (sale_day, product_id, customer_id) DO UPDATE SET
+            order_lines = agg.order_lines + EXCLUDED.order_lines,
+            quantity = agg.quantity + EXCLUDED.quantity,
+            revenue = agg.revenue + EXCLUDED.revenue,
+            cogs = agg.cogs + EXCLUDED.cogs
+    """), {"sale_ids": list(sale_ids), "sign": sign})
+
+    # Drop groups whose last order line was removed
+    db.execute(text("""
+        DELETE FROM sales_daily_agg agg
+        USING sales s
+        WHERE s.id = ANY(:sale_ids)
+        AND agg.sale_day = s.sale_date::date
+        AND agg.product_id = s.product_id
+        AND agg.customer_id = COALESCE(s.customer_id, 0)
+        AND agg.order_lines = 0
+    """), {"sale_ids": list(sale_ids)})
+
+    db.execute(text("""
+        INSERT INTO customer_sales_rollup AS r (customer_id, order_lines, revenue)
+        SELECT
+            s.customer_id,
+            :sign * COUNT(*),
+            :sign * SUM(s.quantity * s.price_per_unit)
+        FROM sales s
+        WHERE s.id = ANY(:sale_ids)
+        AND s.customer_id IS NOT NULL
+        GROUP BY s.customer_id
+        ON CONFLICT (customer_id) DO UPDATE SET
+            order_lines = r.order_lines + EXCLUDED.order_lines,
+            revenue = r.revenue + EXCLUDED.revenue
+    """), {"sale_ids": list(sale_ids), "sign": sign})
+
+    db.execute(text("""
+        INSERT INTO product_usage AS u (product_id, sales_count)
+        SELECT s.product_id, :sign * COUNT(*)
+        FROM sales s
+        WHERE s.id = ANY(:sale_ids)
+        GROUP BY s.product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            sales_count = u.sales_count + EXCLUDED.sales_count
+    """), {"sale_ids": list(sale_ids), "sign": sign})
+
+    apply_stock_movements(db, "sale", sale_ids, sign)
+
+def _apply_production_delta(db, batch_ids, sign):
+    """Add (sign=1) or subtract (sign=-1) production batches from the aggregates"""
+    db.execute(text("""
+        INSERT INTO product_usage AS u (product_id, production_count)
+        SELECT i.product_id, :sign * COUNT(*)
+        FROM inventory i
+        WHERE i.id = ANY(:batch_ids)
+        GROUP BY i.product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            production_count = u.production_count + EXCLUDED.production_count
+    """), {"batch_ids": list(batch_ids), "sign": sign})
+
+    apply_stock_movements(db, "production", batch_ids, sign)
+
+def add_sales_to_aggregates(db, sale_ids):
+    """Apply newly inserted or updated sales rows to the aggregates"""
+    if sale_ids:
+        _apply_sales_delta(db, sale_ids, 1)
+
+def remove_sales_from_aggregates(db, sale_ids):
+    """Remove sales rows that are about to be updated or deleted from the aggregates"""
+    if sale_ids:
+        _apply_sales_delta(db, sale_ids, -1)
+
+def add_production_to_aggregates(db, batch_ids):
+    """Apply newly inserted or updated production batches to the aggregates"""
+    if batch_ids:
+        _apply_production_delta(db, batch_ids, 1)
+
+def remove_production_from_aggregates(db, batch_ids):
+    """Remove production batches that are about to be updated or deleted from the aggregates"""
+    if batch_ids:
+        _apply_production_delta(db, batch_ids, -1)
+
+def refresh_product_aggregates(db, product_id):
+    """Re-derive the product-dependent columns after a product is edited"""
+    db.execute(text("""
+        UPDATE sales_daily_agg agg
+        SET category = p.category,
+            cogs = agg.quantity * COALESCE(p.base_price, 0)
+        FROM products p
+        WHERE p.id = :product_id
+        AND agg.product_id = p.id
+    """), {"product_id": product_id})
+
+def rebuild_aggregates(db):
+    """Recompute every aggregate table from the sales and production history"""
+    db.execute(text("TRUNCATE sales_daily_agg"))
+    db.execute(text("""
+        INSERT INTO sales_daily_agg
+            (sale_day, product_id, customer_id, category,
+             order_lines, quantity, revenue, cogs)
+        SELECT
+            s.sale_date::date,
+            s.product_id,
+            COALESCE(s.customer_id, 0),
+            p.category,
+            COUNT(*),
+            SUM(s.quantity),
+            SUM(s.quantity * s.price_per_unit),
+            SUM(s.quantity * COALESCE(p.base_price, 0))
+        FROM sales s
+        JOIN products p ON s.product_id = p.id
+        GROUP BY s.sale_date::date, s.product_id, COALESCE(s.customer_id, 0), p.category
+    """))
+
+    db.execute(text("TRUNCATE customer_sales_rollup"))
+    db.execute(text("""
+        INSERT INTO customer_sales_rollup (customer_id, order_lines, revenue)
+        SELECT customer_id, COUNT(*), SUM(quantity * price_per_unit)
+        FROM sales
+        WHERE customer_id IS NOT NULL
+        GROUP BY customer_id
+    """))
+
+    db.execute(text("TRUNCATE product_usage"))
+    db.execute(text("""
+        INSERT INTO product_usage (product_id, sales_count, production_count)
+        SELECT
+            p.id,
+            (SELECT COUNT(*) FROM sales s WHERE s.product_id = p.id),
+            (SELECT COUNT(*) FROM inventory i WHERE i.product_id = p.id)
+        FROM products p
+    """))
+
+    rebuild_stock(db)
+    rebuild_allocations(db)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintained aggregate tables")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute all aggregates from the sales and production history")
+    parser.add_argument("--allocations", action="store_true",
+                        help="re-allocate all order lines to the production batches, "
+                             "a group of products per transaction")
+    parser.add_argument("--chunk-size", type=int, default=ALLOCATION_CHUNK,
+                        help=f"products per transaction for --allocations (default {ALLOCATION_CHUNK})")
+    args = parser.parse_args(argv)
+
+    if not (args.rebuild or args.allocations):
+        parser.print_help()
+        return 1
+
+    from app.database.connection import configure_engine, db_session
+
+    configure_engine(application_name="inventory-aggregates", pool_size=1,
+                     max_overflow=0, statement_timeout=0)
+
+    if args.allocations:
+        with db_session() as db:
+            product_ids = db.execute(text("SELECT id FROM products ORDER BY id")).scalars().all()
+        # Products are allocated independently, so each group commits on its
+        # own and holds its locks only briefly
+        for start in range(0, len(product_ids), args.chunk_size):
+            with db_session() as db:
+                rebuild_allocations(db, product_ids[start:start + args.chunk_size])
+                db.commit()
+        print(f"Order lines of {len(product_ids)} products re-allocated")
+        return 0
+
+    with db_session() as db:
+        rebuild_aggregates(db)
+        db.commit()
+    print("Aggregates rebuilt")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
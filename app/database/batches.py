@@ -0,0 +1,253 @@
+"""Per-batch remaining stock, depleted FIFO by the orders
+
+Every production batch keeps the quantity still in it in
+inventory.remaining_quantity. When an order is committed, each order line
+draws on the open batches of its product that expire first (see
+app.utils.fifo) and batch_allocations records what it took from which
+batch. Editing or deleting an order line releases its allocations back to
+the batches first, and changing or deleting a batch releases the
+allocations made from it, after which the affected lines are allocated
+again.
+
+Allocations are made in the order the writes happen, so a line entered
+for a past date only draws on what later lines left over. Rebuilding the
+aggregates re-allocates all lines in date order.
+"""
+import pandas as pd
+from sqlalchemy import text
+from app.utils.buckets import bucket_indices, bucket_labels, horizon_end
+from app.utils.fifo import allocate_fifo_lines
+from app.utils.helpers import cached_fetchall
+
+# Open batches the order lines of some products can draw on, locked so that
+# concurrent orders see each other's allocations
+OPEN_BATCHES_QUERY = text("""
+    SELECT id, product_id, production_date, expiry_date, remaining_quantity
+    FROM inventory
+    WHERE product_id = ANY(:product_ids)
+    AND production_date <= :last_day
+    AND expiry_date >= :first_day
+    AND remaining_quantity > 0
+    ORDER BY id
+    FOR UPDATE
+""")
+
+EXPIRING_BATCHES_QUERY = text("""
+    SELECT
+        i.id,
+        i.product_id,
+        p.name,
+        c.name as category,
+        i.remaining_quantity as quantity,
+        i.unit,
+        i.expiry_date
+    FROM inventory i
+    JOIN products p ON i.product_id = p.id
+    JOIN categories c ON p.category = c.name
+    WHERE i.expiry_date BETWEEN :start_date AND :end_date
+    AND i.remaining_quantity > 0
+    ORDER BY i.expiry_date, i.product_id
+""")
+
+def allocate_sales(db, sale_ids):
+    """Allocate the part of each order line that no batch covers yet"""
+    if not sale_ids:
+        return
+
+    sales = db.execute(text("""
+        SELECT s.id, s.product_id, s.sale_date::date as sale_day,
+               s.quantity - COALESCE(a.quantity, 0) as open_quantity
+        FROM sales s
+        LEFT JOIN (
+            SELECT sale_id, SUM(quantity) as quantity
+            FROM batch_allocations
+            WHERE sale_id = ANY(:sale_ids)
+            GROUP BY sale_id
+        ) a ON a.sale_id = s.id
+        WHERE s.id = ANY(:sale_ids)
+        AND s.product_id IS NOT NULL
+        AND s.quantity > COALESCE(a.quantity, 0)
+    """), {"sale_ids": list(sale_ids)}).fetchall()
+    if not sales:
+        return
+
+    batches = db.execute(OPEN_BATCHES_QUERY, {
+        "product_ids": sorted({s.product_id for s in sales}),
+        "first_day": min(s.sale_day for s in sales),
+        "last_day": max(s.sale_day for s in sales)
+    }).fetchall()
+
+    batches_by_product = {}
+    for b in batches:
+        batches_by_product.setdefault(b.product_id, []).append(
+            (b.id, b.production_date, b.expiry_date, b.remaining_quantity)
+        )
+    sales_by_product = {}
+    for s in sales:
+        sales_by_product.setdefault(s.product_id, []).append((s.id, s.sale_day, s.open_quantity))
+
+    remaining = {}
+    allocations = []
+    for product_id, product_sales in sales_by_product.items():
+        product_remaining, product_allocations = allocate_fifo_lines(
+            batches_by_product.get(product_id, []), product_sales
+        )
+        remaining.update(product_remaining)
+        allocations.extend(product_allocations)
+    if not allocations:
+        return
+
+    db.execute(text("""
+        INSERT INTO batch_allocations AS a (sale_id, batch_id, quantity)
+        SELECT * FROM unnest(
+            CAST(:sale_ids AS INTEGER[]),
+            CAST(:batch_ids AS INTEGER[]),
+            CAST(:quantities AS DECIMAL[])
+        )
+        ON CONFLICT (sale_id, batch_id) DO UPDATE SET
+            quantity = a.quantity + EXCLUDED.quantity
+    """), {
+        "sale_ids": [sale_id for sale_id, _, _ in allocations],
+        "batch_ids": [batch_id for _, batch_id, _ in allocations],
+        "quantities": [quantity for _, _, quantity in allocations]
+    })
+
+    drawn = sorted({batch_id for _, batch_id, _ in allocations})
+    db.execute(text("""
+        UPDATE inventory i
+        SET remaining_quantity = r.remaining
+        FROM unnest(CAST(:batch_ids AS INTEGER[]), CAST(:remaining AS DECIMAL[]))
+            AS r(batch_id, remaining)
+        WHERE i.id = r.batch_id
+    """), {"batch_ids": drawn, "remaining": [remaining[batch_id] for batch_id in drawn]})
+
+def release_sales(db, sale_ids):
+    """Return what order lines took from their batches, before the lines
+    are updated or deleted"""
+    if not sale_ids:
+        return
+    db.execute(text("""
+        UPDATE inventory i
+        SET remaining_quantity = i.remaining_quantity + a.quantity
+        FROM (
+            SELECT batch_id, SUM(quantity) as quantity
+            FROM batch_allocations
+            WHERE sale_id = ANY(:sale_ids)
+            GROUP BY batch_id
+        ) a
+        WHERE i.id = a.batch_id
+    """), {"sale_ids": list(sale_ids)})
+    db.execute(text("""
+        DELETE FROM batch_allocations WHERE sale_id = ANY(:sale_ids)
+    """), {"sale_ids": list(sale_ids)})
+
+def release_batches(db, batch_ids):
+    """Undo the allocations made from batches before they are updated or
+    deleted; returns the ids of the order lines to allocate again afterwards"""
+    if not batch_ids:
+        return []
+    released = db.execute(text("""
+        DELETE FROM batch_allocations WHERE batch_id = ANY(:batch_ids)
+        RETURNING sale_id
+    """), {"batch_ids": list(batch_ids)}).scalars().all()
+    db.execute(text("""
+        UPDATE inventory SET remaining_quantity = quantity WHERE id = ANY(:batch_ids)
+    """), {"batch_ids": list(batch_ids)})
+    return sorted(set(released))
+
+def allocate_to_batches(db, batch_ids):
+    """Allocate order lines that are short of stock and that new or changed
+    batches can serve"""
+    if not batch_ids:
+        return
+    short = db.execute(text("""
+        SELECT s.id
+        FROM inventory i
+        JOIN sales s
+            ON s.product_id = i.product_id
+            AND s.sale_date >= i.production_date
+            AND s.sale_date < i.expiry_date + INTERVAL '1 day'
+        WHERE i.id = ANY(:batch_ids)
+        AND s.quantity > (
+            SELECT COALESCE(SUM(a.quantity), 0)
+            FROM batch_allocations a
+            WHERE a.sale_id = s.id
+        )
+    """), {"batch_ids": list(batch_ids)}).scalars().all()
+    allocate_sales(db, sorted(set(short)))
+
+def get_expiring_batches(db, start_date, end_date):
+    """Batches expiring between the dates that still hold stock, with what is left in them"""
+    return cached_fetchall(db, EXPIRING_BATCHES_QUERY, {
+        "start_date": start_date,
+        "end_date": end_date
+    }, tables=("inventory", "sales", "products", "categories"))
+
+def expiry_buckets(db, start_date, periods, granularity):
+    """Stock expiring per bucket from start_date, with the batches behind it
+
+    Returns (labels, quantities, details) where details maps each label to
+    the batches expiring in that bucket, counting only what the recorded
+    orders (including future ones) left in them.
+    """
+    end_date = horizon_end(start_date, periods, granularity)
+    batches = get_expiring_batches(db, start_date, end_date)
+
+    expiring = pd.DataFrame([
+        {
+            'Product ID': str(b.product_id),
+            'Product': b.name,
+            'Category': b.category,
+            'remaining': b.quantity,
+            'unit': b.unit,
+            'expiry_date': b.expiry_date
+        }
+        for b in batches
+    ], columns=['Product ID', 'Product', 'Category', 'remaining', 'unit', 'expiry_date'])
+    expiring['bucket'] = bucket_indices(expiring['expiry_date'].tolist(), start_date, granularity)
+    expiring = expiring.sort_values(['expiry_date', 'Product ID'])
+
+    # Bucket in a single groupby
+    labels = bucket_labels(start_date, periods, granularity)
+    quantities = [0.0] * periods
+    details = {label: [] for label in labels}
+    for bucket, group in expiring.groupby('bucket'):
+        quantities[bucket] = float(group['remaining'].sum())
+        details[labels[bucket]] = [
+            {
+                'Product ID': r['Product ID'],
+                'Product': r['Product'],
+                'Category': r['Category'],
+                'Quantity': f"{r['remaining']} {r['unit']}",
+                'Expiry Date': r['expiry_date'].strftime('%Y-%m-%d')
+            }
+            for r in group.to_dict('records')
+        ]
+
+    return labels, quantities, details
+
+def rebuild_allocations(db, product_ids=None):
+    """Re-allocate the order lines of the given products (all products if
+    None) in date order from full batches"""
+    if product_ids is None:
+        db.execute(text("TRUNCATE batch_allocations"))
+        db.execute(text("UPDATE inventory SET remaining_quantity = quantity"))
+        sale_ids = db.execute(text("""
+            SELECT id FROM sales WHERE product_id IS NOT NULL
+        """)).scalars().all()
+    else:
+        params = {"product_ids": list(product_ids)}
+        db.execute(text("""
+            DELETE FROM batch_allocations a
+            USING inventory i
+            WHERE a.batch_id = i.id
+            AND i.product_id = ANY(:product_ids)
+        """), params)
+        db.execute(text("""
+            UPDATE inventory SET remaining_quantity = quantity
+            WHERE product_id = ANY(:product_ids)
+        """), params)
+        sale_ids = db.execute(text("""
+            SELECT id FROM sales WHERE product_id = ANY(:product_ids)
+        """), params).scalars().all()
+    allocate_sales(db, sale_ids)
@@ -0,0 +1,51 @@
+"""Bulk write helpers that send a whole batch in one round trip"""
+import re
+from sqlalchemy import text
+
+MAX_ROWS_PER_STATEMENT = 1000
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def _check_identifier(name):
+    """Guard table and column names, which are interpolated into the SQL"""
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+def bulk_insert(db, table, rows, returning="id"):
+    """Insert rows as multi-row INSERT ... VALUES statements
+
+    rows is a list of dicts that all have the same keys. Rows are sent in
+    batches of MAX_ROWS_PER_STATEMENT, each as a single statement, and the
+    generated ids are returned in the same order as rows.
+    """
+    if not rows:
+        return []
+
+    columns = [_check_identifier(c) for c in rows[0]]
+    _check_identifier(table)
+    if returning:
+        _check_identifier(returning)
+
+    ids = []
+    for offset in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+        batch = rows[offset:offset + MAX_ROWS_PER_STATEMENT]
+        params = {}
+        values = []
+        for i, row in enumerate(batch):
+            placeholders = []
+            for j, column in enumerate(columns):
+                key = f"r{i}_{j}"
+                params[key] = row[column]
+                placeholders.append(f":{key}")
+            values.append(f"({', '.join(placeholders)})")
+
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join(values)}"
+        if returning:
+            query += f" RETURNING {returning}"
+            # Serial ids are drawn in VALUES order, so sorting them restores
+            # the input order regardless of the order RETURNING emits them in
+            ids.extend(sorted(db.execute(text(query), params).scalars().all()))
+        else:
+            db.execute(text(query), params)
+    return ids
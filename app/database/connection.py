@@ -1,41 +1,163 @@
+"""Database engine factory and sessions
+
+Every process uses one engine, created from the DB_* environment settings
+by create_db_engine() and shared through get_engine(). Processes other than
+the Streamlit app (the JSON API, batch commands) call configure_engine()
+before their first query to set their own application_name and a pool
+sized for their work, so they never open a second pool next to this one.
+"""
+from contextlib import contextmanager
+import logging
+import os
+import threading
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
-import os
 import streamlit as st
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
-# Database URL with correct port
-DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=0,
-    connect_args={
-        'sslmode': 'require',  # Adding SSL mode for Aiven
-        'connect_timeout': 10  # Adding connection timeout
+# Log a warning when waiting this long for a pooled connection
+SLOW_CHECKOUT_SECONDS = float(os.getenv('DB_SLOW_CHECKOUT_SECONDS', '1'))
+
+def _env(name, default=None):
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+def engine_settings(**overrides):
+    """Get the engine settings from the environment, with overrides applied"""
+    settings = {
+        # Connection pool (per process)
+        "pool_size": int(_env('DB_POOL_SIZE', '5')),
+        "max_overflow": int(_env('DB_MAX_OVERFLOW', '10')),
+        "pool_timeout": int(_env('DB_POOL_TIMEOUT', '30')),
+        # Replace connections older than this (seconds) before the server
+        # or a proxy drops them
+        "pool_recycle": int(_env('DB_POOL_RECYCLE', '1800')),
+        # Cancel statements running longer than this (milliseconds, 0 = off)
+        "statement_timeout": int(_env('DB_STATEMENT_TIMEOUT_MS', '30000')),
+        # Shown in pg_stat_activity to tell processes apart
+        "application_name": _env('DB_APPLICATION_NAME', 'inventory-app'),
+        # Rows fetched per round trip by server-side cursors (queries run
+        # with stream_results)
+        "stream_buffer_rows": int(_env('DB_STREAM_BUFFER_ROWS', '1000')),
+        "sslmode": _env('DB_SSLMODE', 'require'),
+        "connect_timeout": int(_env('DB_CONNECT_TIMEOUT', '10')),
+    }
+    settings.update(overrides)
+    return settings
+
+def create_db_engine(**overrides):
+    """Create an engine from the environment settings (see engine_settings)"""
+    settings = engine_settings(**overrides)
+    port = _env('DB_PORT')
+    url = URL.create(
+        "postgresql",
+        username=_env('DB_USER'),
+        password=_env('DB_PASSWORD'),
+        host=_env('DB_HOST'),
+        port=int(port) if port else None,
+        database=_env('DB_NAME'),
+    )
+
+    connect_args = {
+        'sslmode': settings["sslmode"],
+        'connect_timeout': settings["connect_timeout"],
+        'application_name': settings["application_name"],
     }
-)
+    if settings["statement_timeout"]:
+        connect_args['options'] = f"-c statement_timeout={settings['statement_timeout']}"
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        pool_timeout=settings["pool_timeout"],
+        pool_recycle=settings["pool_recycle"],
+        execution_options={"max_row_buffer": settings["stream_buffer_rows"]},
+        connect_args=connect_args
+    )
+
+# Settings overridden by configure_engine() for this process
+_engine_overrides = {}
+
+def configure_engine(**overrides):
+    """Override engine settings for this process; call before the first query
+
+    Returns the settings the engine will be created with.
+    """
+    _engine_overrides.update(overrides)
+    return engine_settings(**_engine_overrides)
 
 @st.cache_resource
 def get_engine():
-    return engine
+    """Get the engine of this process, shared by all sessions"""
+    return create_db_engine(**_engine_overrides)
+
+# Create session factory; sessions are bound to the engine when created
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# Pool checkout wait times, shared by all sessions in the process
+_checkout_lock = threading.Lock()
+_checkout_stats = {"checkouts": 0, "total_wait": 0.0, "max_wait": 0.0, "slow_checkouts": 0}
+
+def _record_checkout_wait(seconds):
+    """Record how long a session waited for a pooled connection"""
+    with _checkout_lock:
+        _checkout_stats["checkouts"] += 1
+        _checkout_stats["total_wait"] += seconds
+        _checkout_stats["max_wait"] = max(_checkout_stats["max_wait"], seconds)
+        if seconds >= SLOW_CHECKOUT_SECONDS:
+            _checkout_stats["slow_checkouts"] += 1
+    if seconds >= SLOW_CHECKOUT_SECONDS:
+        logger.warning(
+            "Waited %.2fs for a database connection (%s)", seconds, get_engine().pool.status()
+        )
+
+def get_pool_stats():
+    """Get connection pool usage and checkout wait statistics"""
+    with _checkout_lock:
+        stats = dict(_checkout_stats)
+    pool = get_engine().pool
+    stats["avg_wait"] = stats["total_wait"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    stats["pool_size"] = pool.size()
+    stats["checked_out"] = pool.checkedout()
+    stats["overflow"] = pool.overflow()
+    return stats
+
+@contextmanager
+def db_session():
+    """Check out a pooled session for one unit of work and return it afterwards"""
+    db = SessionLocal(bind=get_engine())
+    try:
+        started = time.perf_counter()
+        db.connection()
+        _record_checkout_wait(time.perf_counter() - started)
+        yield db
+    finally:
+        # Closing rolls back anything uncommitted and returns the connection
+        db.close()
+
+@contextmanager
+def page_session():
+    """Expose a short-lived session as st.session_state.db for one page render"""
+    with db_session() as db:
+        st.session_state.db = db
+        try:
+            yield db
+        finally:
+            del st.session_state['db']
 
 def init_db():
-    """Initialize database connection in Streamlit session state"""
-    if 'db' not in st.session_state:
-        st.session_state.db = SessionLocal()
+    """Initialize the shared database engine"""
+    get_engine()
 
 def get_db():
-    """Get database session"""
-    if 'db' not in st.session_state:
-        init_db()
-    return st.session_state.db
\ No newline at end of file
+    """Get the database session of the current page render"""
+    return st.session_state.db
@@ -1,19 +1,10 @@
+"""Session dependency for code outside the Streamlit pages
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
-DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+The engine and its settings live in connection.py; this module only hands
+out sessions from that same pool.
+"""
+from app.database.connection import db_session
 
 def get_db():
-    db = SessionLocal()
-    try:
+    with db_session() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
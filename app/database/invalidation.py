@@ -0,0 +1,78 @@
+"""Cache invalidation across processes through LISTEN/NOTIFY
+
+invalidate() only drops the cached results of the process that calls it,
+but the Streamlit app and the JSON API run in separate processes and both
+write orders. Migration 011 makes every committed write to a cached table
+send the table name on the cache_invalidation channel. Each process runs a
+listener thread on a dedicated connection that passes the names it
+receives to invalidate(), so a write in one process drops the stale
+results of all of them within moments of its commit.
+
+A result read before a commit and stored after it is safe as well: the
+notification arrives after the commit and drops it. Whenever the listener
+(re)connects it clears the whole cache, since notifications sent while it
+was not listening are lost.
+"""
+import logging
+import select
+import threading
+import streamlit as st
+from app.database.connection import get_engine
+from app.utils.helpers import clear_cache, invalidate
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+
+# Check the listening connection after this long without notifications
+POLL_SECONDS = 30
+# Wait this long before reconnecting after the connection failed
+RETRY_SECONDS = 5
+
+def _connect(engine):
+    """Open a connection outside the pool that listens on the channel"""
+    pooled = engine.raw_connection()
+    conn = pooled.driver_connection
+    # The listener keeps its connection for good; let the pool replace it
+    pooled.detach()
+    conn.rollback()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {CHANNEL}")
+    return conn
+
+def listen_for_invalidations(engine, stop=None, poll_seconds=POLL_SECONDS):
+    """Invalidate the cached tables named by notifications until stop is set"""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = _connect(engine)
+            clear_cache()
+            while not stop.is_set():
+                if select.select([conn], [], [], poll_seconds) == ([], [], []):
+                    # Nothing for a while; make sure the connection is alive
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                conn.poll()
+                tables = {notify.payload for notify in conn.notifies}
+                conn.notifies.clear()
+                if tables:
+                    invalidate(*tables)
+        except Exception as e:
+            logger.warning("Cache invalidation listener failed, reconnecting: %s", e)
+            clear_cache()
+            stop.wait(RETRY_SECONDS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+@st.cache_resource
+def start_cache_listener():
+    """Start the listener thread of this process, once"""
+    thread = threading.Thread(
+        target=listen_for_invalidations, args=(get_engine(),),
+        name="cache-invalidation", daemon=True
+    )
+    thread.start()
+    return thread
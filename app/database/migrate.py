@@ -0,0 +1,212 @@
+"""Apply versioned SQL migrations and check that queries use their indexes
+
+Usage:
+    python -m app.database.migrate            # apply pending migrations
+    python -m app.database.migrate --status   # list applied and pending migrations
+    python -m app.database.migrate --check    # EXPLAIN the dashboard queries
+"""
+import argparse
+import json
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "sql" / "migrations"
+
+def index_checks(today):
+    """The Overview, Reports and Search queries as the app runs them, with
+    their parameters and the indexes either of which should serve them
+
+    The queries are taken from the modules that run them, so the check
+    always explains the current query text.
+    """
+    from app.database.batches import EXPIRING_BATCHES_QUERY, OPEN_BATCHES_QUERY
+    from app.database.models import production_query, sales_query
+    from app.database.product_search import product_search_query
+    from app.database.stock import stock_changes_query, stock_levels_query
+    from app.pages.customers import CUSTOMER_USAGE_QUERY, customer_search_query
+    from app.pages.overview import REVENUE_QUERY
+    from app.pages.products import PRODUCT_USAGE_QUERY
+    from app.pages.reports import DAILY_DATA_QUERY
+
+    end_date = today + timedelta(weeks=26)
+    dates = {"start_date": today, "end_date": end_date}
+    product_search, product_search_params = product_search_query("stout")
+    customer_search, customer_search_params = customer_search_query("stout")
+    stock, stock_params = stock_levels_query(today)
+    stock_changes, stock_changes_params = stock_changes_query(today, end_date)
+
+    return {
+        "Overview: current stock": (stock, stock_params, ("stock_balance_pkey",)),
+        "Overview: future stock changes": (
+            stock_changes, stock_changes_params, ("idx_stock_balance_date",)
+        ),
+        "Overview: expiring stock": (
+            EXPIRING_BATCHES_QUERY, dates, ("idx_inventory_expiry_date_remaining",)
+        ),
+        "Overview: revenue projection": (REVENUE_QUERY, dates, ("idx_sales_daily_agg_key",)),
+        "Orders: open batches": (
+            OPEN_BATCHES_QUERY,
+            {"product_ids": [1], "first_day": today, "last_day": end_date},
+            ("idx_inventory_product_expiry_remaining",)
+        ),
+        "Reports: daily revenue": (DAILY_DATA_QUERY, dates, ("idx_sales_daily_agg_key",)),
+        "Search: orders by customer": (
+            sales_query(today, end_date, customer_id=1), {}, ("idx_sales_customer_date",)
+        ),
+        "Search: production by date": (
+            production_query(today, end_date), {}, ("idx_inventory_production_date_id",)
+        ),
+        "Search: products": (
+            product_search, product_search_params, ("idx_products_search_trgm",)
+        ),
+        "Search: customers": (
+            customer_search, customer_search_params,
+            ("idx_customers_name_trgm", "idx_customers_contact_info_trgm")
+        ),
+        "Browse: orders page": (
+            sales_query(today, end_date, after=(end_date, 1)), {}, ("idx_sales_sale_date_id",)
+        ),
+        "Browse: recent orders": (
+            sales_query(None, None, after=(end_date, 1)), {}, ("idx_sales_sale_date_id",)
+        ),
+        "Browse: production page": (
+            production_query(today, end_date, after=(end_date, 1)), {},
+            ("idx_inventory_production_date_id",)
+        ),
+        "Guard: product delete": (
+            PRODUCT_USAGE_QUERY, {"id": 1},
+            ("idx_sales_product_date", "idx_inventory_product_production_date")
+        ),
+        "Guard: customer delete": (CUSTOMER_USAGE_QUERY, {"id": 1}, ("idx_sales_customer_date",)),
+    }
+
+def get_migration_files():
+    """Get migration files ordered by version"""
+    return sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+def get_applied_versions(conn):
+    """Get the set of migration versions already applied"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(255) PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    rows = conn.execute(text("SELECT version FROM schema_migrations")).fetchall()
+    return {r.version for r in rows}
+
+def apply_migrations(engine):
+    """Apply all pending migrations, each in its own transaction"""
+    with engine.begin() as conn:
+        applied = get_applied_versions(conn)
+
+    newly_applied = []
+    for path in get_migration_files():
+        version = path.stem
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            conn.exec_driver_sql(path.read_text())
+            conn.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+                {"version": version}
+            )
+        newly_applied.append(version)
+    return newly_applied
+
+def get_used_indexes(plan):
+    """Collect the index names referenced anywhere in an EXPLAIN plan"""
+    indexes = set()
+    if "Index Name" in plan:
+        indexes.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        indexes |= get_used_indexes(child)
+    return indexes
+
+def explain(conn, query, params):
+    """Get the JSON plan of a text() query or a select statement"""
+    compiled = query.compile(dialect=conn.dialect)
+    parameters = {**compiled.params, **params}
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + compiled.string, parameters).scalar()
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+def check_index_usage(engine, force_index=False):
+    """EXPLAIN each app query of index_checks() and report which indexes it uses
+
+    With force_index, sequential scans are disabled for the check so that
+    small tables still show whether an index is able to serve the query.
+    """
+    results = []
+    with engine.connect() as conn:
+        for name, (query, params, indexes) in index_checks(date.today()).items():
+            try:
+                with conn.begin():
+                    if force_index:
+                        conn.execute(text("SET LOCAL enable_seqscan = off"))
+                    plan = explain(conn, query, params)
+            except DBAPIError as e:
+                results.append({
+                    "check": name, "expected": indexes, "used": [], "ok": False,
+                    "error": str(e.orig).strip()
+                })
+                continue
+            used = get_used_indexes(plan[0]["Plan"])
+            results.append({
+                "check": name,
+                "expected": indexes,
+                "used": sorted(used),
+                "ok": bool(used.intersection(indexes))
+            })
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Database migrations")
+    parser.add_argument("--status", action="store_true",
+                        help="list applied and pending migrations")
+    parser.add_argument("--check", action="store_true",
+                        help="EXPLAIN dashboard queries and verify index usage")
+    parser.add_argument("--force-index", action="store_true",
+                        help="disable sequential scans during --check")
+    args = parser.parse_args(argv)
+
+    from app.database.connection import configure_engine, get_engine
+
+    # Index builds may legitimately run for a long time
+    configure_engine(application_name="inventory-migrate", pool_size=1,
+                     max_overflow=0, statement_timeout=0)
+    engine = get_engine()
+
+    if args.status:
+        with engine.begin() as conn:
+            applied = get_applied_versions(conn)
+        for path in get_migration_files():
+            state = "applied" if path.stem in applied else "pending"
+            print(f"{path.stem}: {state}")
+        return 0
+
+    if args.check:
+        results = check_index_usage(engine, force_index=args.force_index)
+        for r in results:
+            status = "OK" if r["ok"] else "MISSING"
+            used = r.get("error") or ", ".join(r["used"]) or "sequential scan"
+            expected = " or ".join(r["expected"])
+            if r.get("error"):
+                print(f"[ERROR] {r['check']}: expected {expected}, {used}")
+                continue
+            print(f"[{status}] {r['check']}: expected {expected}, used {used}")
+        return 0 if all(r["ok"] for r in results) else 1
+
+    applied = apply_migrations(engine)
+    if applied:
+        for version in applied:
+            print(f"Applied {version}")
+    else:
+        print("Database is up to date")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Declarative models and shared query helpers
+
+The *_frame helpers select plain columns through the models' relationships
+and return the result as a pandas DataFrame, so pages do not copy joins
+and row-to-dict loops. They read through a server-side cursor, page with
+a keyset cursor (the (date, id) of the last row of the previous page)
+rather than OFFSET, and go through the query cache, tagged with the
+tables they read. The *_totals helpers aggregate the same
+filters in SQL, so a page of rows never requires loading all of them.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+import pandas as pd
+from sqlalchemy import Date, DateTime, ForeignKey, Integer, Numeric, String, Text, func, select, tuple_
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+
+from app.utils.helpers import cached_fetchall
+
+class Base(DeclarativeBase):
+    pass
+
+class Category(Base):
+    __tablename__ = "categories"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(50), unique=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now())
+
+    products: Mapped[List["Product"]] = relationship(back_populates="category_ref")
+
+class Product(Base):
+    __tablename__ = "products"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String)
+    # Products reference their category by name
+    category: Mapped[Optional[str]] = mapped_column(ForeignKey("categories.name"))
+    description: Mapped[Optional[str]] = mapped_column(Text)
+    base_price: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 2))
+    days_to_expiration: Mapped[Optional[int]]
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now())
+
+    category_ref: Mapped[Optional[Category]] = relationship(back_populates="products")
+    batches: Mapped[List["Inventory"]] = relationship(back_populates="product")
+    sales: Mapped[List["Sale"]] = relationship(back_populates="product")
+
+class Customer(Base):
+    __tablename__ = "customers"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(100))
+    contact_info: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now())
+
+    sales: Mapped[List["Sale"]] = relationship(back_populates="customer")
+
+class Inventory(Base):
+    """A production batch"""
+    __tablename__ = "inventory"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    product_id: Mapped[Optional[int]] = mapped_column(ForeignKey("products.id"))
+    quantity: Mapped[Decimal] = mapped_column(Numeric(10, 2))
+    unit: Mapped[str] = mapped_column(String(20))
+    production_date: Mapped[date] = mapped_column(Date)
+    expiry_date: Mapped[date] = mapped_column(Date)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now())
+
+    product: Mapped[Optional[Product]] = relationship(back_populates="batches")
+
+class Sale(Base):
+    """An order line"""
+    __tablename__ = "sales"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    product_id: Mapped[Optional[int]] = mapped_column(ForeignKey("products.id"))
+    customer_id: Mapped[Optional[int]] = mapped_column(ForeignKey("customers.id"))
+    quantity: Mapped[Decimal] = mapped_column(Numeric(10, 2))
+    unit: Mapped[str] = mapped_column(String(20))
+    price_per_unit: Mapped[Decimal] = mapped_column(Numeric(10, 2))
+    sale_date: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now())
+    status: Mapped[Optional[str]] = mapped_column(String(20), server_default="completed")
+
+    product: Mapped[Optional[Product]] = relationship(back_populates="sales")
+    customer: Mapped[Optional[Customer]] = relationship(back_populates="sales")
+
+def frame(db, stmt, tables, limit=None):
+    """Run a column select through the query cache and return a DataFrame
+
+    Rows are fetched through a server-side cursor in chunks of
+    DB_STREAM_BUFFER_ROWS, so the driver never buffers the whole result.
+    """
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    stmt = stmt.execution_options(stream_results=True)
+    rows = cached_fetchall(db, stmt, tables=tables)
+    columns = [column.name for column in stmt.selected_columns]
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+def _sales_filters(start_date, end_date, customer_id, category):
+    # Lines without a date are left out even without date bounds, since
+    # they cannot be paged by date
+    conditions = [Sale.sale_date.isnot(None)]
+    if start_date is not None:
+        conditions.append(Sale.sale_date >= start_date)
+    if end_date is not None:
+        conditions.append(Sale.sale_date < end_date + timedelta(days=1))
+    if customer_id is not None:
+        conditions.append(Sale.customer_id == customer_id)
+    if category:
+        conditions.append(Category.name == category)
+    return conditions
+
+def sales_query(start_date, end_date, customer_id=None, category=None, after=None):
+    """Select order lines with customer, product and category names, newest first
+
+    Both dates are inclusive whole days; None leaves that end open. after is
+    the (sale_date, id) of the last row of the previous page.
+    """
+    stmt = (
+        select(
+            Sale.id, Sale.sale_date,
+            Customer.name.label("customer"),
+            Product.name.label("product"),
+            Category.name.label("category"),
+            Sale.quantity, Sale.unit, Sale.price_per_unit,
+            (Sale.quantity * Sale.price_per_unit).label("total")
+        )
+        .join(Sale.product)
+        .join(Product.category_ref)
+        .outerjoin(Sale.customer)
+        .where(*_sales_filters(start_date, end_date, customer_id, category))
+        .order_by(Sale.sale_date.desc(), Sale.id.desc())
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(Sale.sale_date, Sale.id) < tuple(after))
+    return stmt
+
+def sales_frame(db, start_date, end_date, customer_id=None, category=None,
+                limit=None, after=None):
+    """Order lines of sales_query as a DataFrame"""
+    stmt = sales_query(start_date, end_date, customer_id, category, after)
+    return frame(db, stmt, ("sales", "customers", "products", "categories"), limit)
+
+def sales_totals(db, start_date, end_date, customer_id=None, category=None):
+    """Number of order lines and their revenue for the sales_frame filters"""
+    stmt = (
+        select(
+            func.count().label("count"),
+            func.coalesce(func.sum(Sale.quantity * Sale.price_per_unit), 0).label("revenue")
+        )
+        .select_from(Sale)
+        .join(Sale.product)
+        .join(Product.category_ref)
+        .where(*_sales_filters(start_date, end_date, customer_id, category))
+    )
+    return cached_fetchall(db, stmt, tables=("sales", "products", "categories"))[0]
+
+def _production_filters(start_date, end_date, category, search_term):
+    conditions = []
+    if start_date is not None:
+        conditions.append(Inventory.production_date >= start_date)
+    if end_date is not None:
+        conditions.append(Inventory.production_date <= end_date)
+    if category:
+        conditions.append(Category.name == category)
+    if search_term:
+        conditions.append(Product.name.ilike(f"%{search_term}%"))
+    return conditions
+
+def production_query(start_date, end_date, category=None, search_term=None, after=None):
+    """Select production batches with product and category names, newest first
+
+    Both dates are inclusive; None leaves that end open. after is the
+    (production_date, id) of the last row of the previous page.
+    """
+    stmt = (
+        select(
+            Inventory.id, Inventory.production_date, Inventory.expiry_date,
+            Product.name.label("product"),
+            Category.name.label("category"),
+            Inventory.quantity, Inventory.unit
+        )
+        .join(Inventory.product)
+        .join(Product.category_ref)
+        .where(*_production_filters(start_date, end_date, category, search_term))
+        .order_by(Inventory.production_date.desc(), Inventory.id.desc())
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(Inventory.production_date, Inventory.id) < tuple(after))
+    return stmt
+
+def production_frame(db, start_date, end_date, category=None, search_term=None,
+                     limit=None, after=None):
+    """Production batches of production_query as a DataFrame"""
+    stmt = production_query(start_date, end_date, category, search_term, after)
+    return frame(db, stmt, ("inventory", "products", "categories"), limit)
+
+def production_totals(db, start_date, end_date, category=None, search_term=None):
+    """Number of batches and their total quantity for the production_frame filters"""
+    stmt = (
+        select(
+            func.count().label("count"),
+            func.coalesce(func.sum(Inventory.quantity), 0).label("quantity")
+        )
+        .select_from(Inventory)
+        .join(Inventory.product)
+        .join(Product.category_ref)
+        .where(*_production_filters(start_date, end_date, category, search_term))
+    )
+    return cached_fetchall(db, stmt, tables=("inventory", "products", "categories"))[0]
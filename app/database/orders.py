@@ -0,0 +1,24 @@
+"""Order write path shared by the Orders page and the API"""
+from app.database.aggregates import add_sales_to_aggregates
+from app.database.batches import allocate_sales
+from app.database.bulk import bulk_insert
+
+def record_order(db, customer_id, sale_date, items):
+    """Insert the lines of one order, apply them to the aggregates and
+    draw them from the production batches
+
+    items is a list of dicts with product_id, quantity, unit and
+    price_per_unit. Returns the new sale ids in item order. The caller
+    commits.
+    """
+    sale_ids = bulk_insert(db, "sales", [{
+        "product_id": item['product_id'],
+        "customer_id": customer_id,
+        "quantity": item['quantity'],
+        "unit": item['unit'],
+        "price_per_unit": item['price_per_unit'],
+        "sale_date": sale_date
+    } for item in items])
+    add_sales_to_aggregates(db, sale_ids)
+    allocate_sales(db, sale_ids)
+    return sale_ids
@@ -0,0 +1,71 @@
+"""Product search shared by all product pickers
+
+Matches a search term anywhere in a product's ID, name, description or
+category. The match runs against the same expression as the
+idx_products_search_trgm GIN index (sql/migrations/012_product_search_separator.sql),
+so substring searches use the index instead of scanning the table. The
+fields are joined with a newline, as in the in-memory catalog
+(app/utils/catalog.py), so a term never matches across two fields.
+"""
+from sqlalchemy import text
+from app.utils.helpers import cached_fetchall
+
+DEFAULT_LIMIT = 50
+
+# Must stay identical to the indexed expression
+SEARCH_DOCUMENT = (
+    "(CAST(p.id AS TEXT) || E'\\n' || p.name || E'\\n' || "
+    "COALESCE(p.description, '') || E'\\n' || COALESCE(p.category, ''))"
+)
+
+def escape_like(term):
+    """Escape LIKE wildcards so the term is matched literally"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def product_search_query(search_term=None, category=None, limit=DEFAULT_LIMIT):
+    """Build the search query of find_products and its parameters"""
+    query = """
+        SELECT p.id, p.name, p.description, c.name as category_name,
+               p.base_price, p.days_to_expiration
+        FROM products p
+        JOIN categories c ON p.category = c.name
+        WHERE 1=1
+    """
+    params = {}
+
+    if search_term:
+        query += f" AND {SEARCH_DOCUMENT} ILIKE :pattern"
+        params["term"] = search_term
+        params["pattern"] = f"%{escape_like(search_term)}%"
+        params["prefix"] = f"{escape_like(search_term)}%"
+
+    if category:
+        query += " AND p.category = :category"
+        params["category"] = category
+
+    if search_term:
+        query += f"""
+            ORDER BY CAST(p.id AS TEXT) = :term DESC,
+                     p.name ILIKE :prefix DESC,
+                     word_similarity(:term, {SEARCH_DOCUMENT}) DESC,
+                     p.name, p.id
+        """
+    else:
+        query += " ORDER BY p.id"
+
+    if limit is not None:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+
+    return text(query), params
+
+def find_products(db, search_term=None, category=None, limit=DEFAULT_LIMIT):
+    """Search products, best matches first
+
+    Exact ID matches rank first, then names starting with the term, then
+    by trigram word similarity. Without a search term all products (of the
+    category, if given) are returned in ID order. limit=None returns every
+    match.
+    """
+    query, params = product_search_query(search_term, category, limit)
+    return cached_fetchall(db, query, params, tables=("products", "categories"))
@@ -0,0 +1,56 @@
+"""Production write paths of the Production page"""
+from sqlalchemy import text
+from app.database.aggregates import add_production_to_aggregates, remove_production_from_aggregates
+from app.database.batches import allocate_sales, allocate_to_batches, release_batches
+from app.database.bulk import bulk_insert
+
+def record_production(db, items):
+    """Insert production batches, apply them to the aggregates and let
+    order lines short of stock draw on them
+
+    items is a list of dicts with product_id, quantity, unit,
+    production_date and expiry_date. Returns the new batch ids in item
+    order. The caller commits.
+    """
+    batch_ids = bulk_insert(db, "inventory", [{
+        "product_id": item['product_id'],
+        "quantity": item['quantity'],
+        "remaining_quantity": item['quantity'],
+        "unit": item['unit'],
+        "production_date": item['production_date'],
+        "expiry_date": item['expiry_date']
+    } for item in items])
+    add_production_to_aggregates(db, batch_ids)
+    allocate_to_batches(db, batch_ids)
+    return batch_ids
+
+def update_production(db, batch_id, quantity, unit, production_date, expiry_date):
+    """Change a batch; the order lines it served are allocated again
+    afterwards. The caller commits."""
+    released = release_batches(db, [batch_id])
+    remove_production_from_aggregates(db, [batch_id])
+    db.execute(text("""
+        UPDATE inventory
+        SET quantity = :quantity, remaining_quantity = :quantity,
+            unit = :unit,
+            production_date = :prod_date,
+            expiry_date = :exp_date
+        WHERE id = :prod_id
+    """), {
+        "quantity": quantity,
+        "unit": unit,
+        "prod_date": production_date,
+        "exp_date": expiry_date,
+        "prod_id": batch_id
+    })
+    add_production_to_aggregates(db, [batch_id])
+    allocate_sales(db, released)
+    allocate_to_batches(db, [batch_id])
+
+def delete_production(db, batch_id):
+    """Delete a batch; the order lines it served are allocated to other
+    batches. The caller commits."""
+    released = release_batches(db, [batch_id])
+    remove_production_from_aggregates(db, [batch_id])
+    db.execute(text("DELETE FROM inventory WHERE id = :prod_id"), {"prod_id": batch_id})
+    allocate_sales(db, released)
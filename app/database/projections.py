@@ -0,0 +1,186 @@
+"""Nightly stock projection snapshots with intraday deltas
+
+The Overview page projects the stock of every product week by week. Rather
+than every viewer recomputing that projection, a nightly job stores it for
+the day, together with the id of the last stock_ledger entry it includes.
+During the day get_projection() reads the snapshot and applies only the
+ledger entries recorded after it, which are the day's production and order
+writes. Without a snapshot for the day it returns None, and the page
+computes the projection itself.
+
+Usage:
+    python -m app.database.projections --snapshot   # nightly, e.g. cron at 00:30
+    python -m app.database.projections --status
+"""
+import argparse
+from datetime import date
+from decimal import Decimal
+import sys
+from sqlalchemy import text
+from app.utils.buckets import add_buckets, bucket_start
+from app.utils.helpers import cached_fetchall, cached_fetchone
+
+PROJECTION_WEEKS = 26
+
+# Snapshots older than this many days are deleted by --snapshot
+KEEP_DAYS = 7
+
+def write_snapshot(db, as_of, num_weeks=PROJECTION_WEEKS):
+    """Store the projection as of the end of as_of and return the snapshot id
+
+    Week w holds the stock at the end of the w-th week starting from the
+    Monday of as_of, counting every movement after as_of. The caller commits.
+    """
+    # Wait for stock writes in progress and hold off new ones until commit,
+    # so that every ledger entry is either in the snapshot or after ledger_id
+    db.execute(text("LOCK TABLE stock_ledger IN SHARE MODE"))
+    snapshot_id = db.execute(text("""
+        INSERT INTO projection_snapshots (as_of, num_weeks, ledger_id)
+        SELECT :as_of, :num_weeks, COALESCE(MAX(id), 0) FROM stock_ledger
+        RETURNING id
+    """), {"as_of": as_of, "num_weeks": num_weeks}).scalar()
+
+    start = bucket_start(as_of, "week")
+    db.execute(text("""
+        INSERT INTO projection_snapshot_rows (snapshot_id, product_id, opening_stock, weekly_stock)
+        WITH opening AS (
+            SELECT p.id as product_id, COALESCE(SUM(b.balance), 0) as stock
+            FROM products p
+            LEFT JOIN LATERAL (
+                SELECT DISTINCT ON (unit) balance
+                FROM stock_balance
+                WHERE product_id = p.id
+                AND balance_date <= :as_of
+                ORDER BY unit, balance_date DESC
+            ) b ON TRUE
+            GROUP BY p.id
+        ),
+        changes AS (
+            SELECT product_id,
+                   (balance_date - :week_start) / 7 as week,
+                   SUM(produced - sold) as net
+            FROM stock_balance
+            WHERE balance_date > :as_of
+            AND balance_date < :horizon
+            GROUP BY product_id, (balance_date - :week_start) / 7
+        ),
+        weekly AS (
+            SELECT o.product_id,
+                   o.stock as opening,
+                   w.week,
+                   o.stock + COALESCE(SUM(c.net) OVER (
+                       PARTITION BY o.product_id ORDER BY w.week
+                   ), 0) as stock
+            FROM opening o
+            CROSS JOIN generate_series(0, :num_weeks - 1) as w(week)
+            LEFT JOIN changes c ON c.product_id = o.product_id AND c.week = w.week
+        )
+        SELECT :snapshot_id, product_id, opening, array_agg(stock ORDER BY week)
+        FROM weekly
+        GROUP BY product_id, opening
+    """), {
+        "snapshot_id": snapshot_id,
+        "as_of": as_of,
+        "week_start": start,
+        "horizon": add_buckets(start, num_weeks, "week"),
+        "num_weeks": num_weeks
+    })
+    return snapshot_id
+
+def prune_snapshots(db, keep_days=KEEP_DAYS):
+    """Delete snapshots taken for days more than keep_days ago"""
+    return db.execute(text("""
+        DELETE FROM projection_snapshots WHERE as_of < CURRENT_DATE - :keep_days
+    """), {"keep_days": keep_days}).rowcount
+
+def get_projection(db, as_of, num_weeks=PROJECTION_WEEKS):
+    """Get the stock projection as of the end of as_of from the day's snapshot
+
+    Returns a dict of product_id -> {"current_stock", "weekly_stock"} with
+    the ledger entries recorded since the snapshot applied, or None if
+    there is no snapshot for as_of.
+    """
+    snapshot = cached_fetchone(db, text("""
+        SELECT id, ledger_id FROM projection_snapshots
+        WHERE as_of = :as_of AND num_weeks = :num_weeks
+        ORDER BY id DESC
+        LIMIT 1
+    """), {"as_of": as_of, "num_weeks": num_weeks}, tables=("projection_snapshots",))
+    if snapshot is None:
+        return None
+
+    rows = cached_fetchall(db, text("""
+        SELECT product_id, opening_stock, weekly_stock
+        FROM projection_snapshot_rows
+        WHERE snapshot_id = :snapshot_id
+    """), {"snapshot_id": snapshot.id}, tables=("projection_snapshots",))
+
+    # The day's movements, usually a handful of rows
+    deltas = cached_fetchall(db, text("""
+        SELECT product_id, event_date, SUM(quantity) as quantity
+        FROM stock_ledger
+        WHERE id > :ledger_id
+        GROUP BY product_id, event_date
+    """), {"ledger_id": snapshot.ledger_id}, tables=("inventory", "sales"))
+
+    projection = {
+        r.product_id: {"current_stock": r.opening_stock, "weekly_stock": list(r.weekly_stock)}
+        for r in rows
+    }
+    start = bucket_start(as_of, "week")
+    for d in deltas:
+        entry = projection.setdefault(d.product_id, {
+            "current_stock": Decimal(0),
+            "weekly_stock": [Decimal(0)] * num_weeks
+        })
+        if d.event_date <= as_of:
+            entry["current_stock"] += d.quantity
+            first_week = 0
+        else:
+            first_week = (d.event_date - start).days // 7
+        for week in range(first_week, num_weeks):
+            entry["weekly_stock"][week] += d.quantity
+    return projection
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stock projection snapshots")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="store today's projection and delete old snapshots")
+    parser.add_argument("--weeks", type=int, default=PROJECTION_WEEKS,
+                        help=f"weeks to project (default {PROJECTION_WEEKS})")
+    parser.add_argument("--keep-days", type=int, default=KEEP_DAYS,
+                        help=f"days of snapshots to keep (default {KEEP_DAYS})")
+    parser.add_argument("--status", action="store_true",
+                        help="list the stored snapshots")
+    args = parser.parse_args(argv)
+
+    if not (args.snapshot or args.status):
+        parser.print_help()
+        return 1
+
+    from app.database.connection import configure_engine, db_session
+
+    configure_engine(application_name="inventory-projections", pool_size=1,
+                     max_overflow=0, statement_timeout=0)
+
+    with db_session() as db:
+        if args.snapshot:
+            snapshot_id = write_snapshot(db, date.today(), args.weeks)
+            pruned = prune_snapshots(db, args.keep_days)
+            db.commit()
+            print(f"Snapshot {snapshot_id} stored, {pruned} old snapshots deleted")
+        else:
+            snapshots = db.execute(text("""
+                SELECT s.id, s.as_of, s.num_weeks, s.ledger_id, s.created_at,
+                       (SELECT COUNT(*) FROM projection_snapshot_rows r
+                        WHERE r.snapshot_id = s.id) as products
+                FROM projection_snapshots s
+                ORDER BY s.id
+            """)).fetchall()
+            for s in snapshots:
+                print(f"{s.id}\t{s.as_of}\t{s.num_weeks} weeks\t{s.products} products\t"
+                      f"ledger {s.ledger_id}\ttaken {s.created_at:%Y-%m-%d %H:%M}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Stock ledger and running stock balances
+
+Every production batch and order line is recorded in stock_ledger as a
+signed movement: production adds stock on its production date and an
+order line removes it on its sale date. Edits and deletes append
+reversing entries, so the ledger keeps the full history of changes.
+
+stock_balance has one row per product, unit and day with movements,
+holding that day's production, sales and closing balance. The stock on
+any date is the latest row on or before it, a single primary key lookup
+instead of a sum over all history. A movement on a past date also shifts
+the balance of the later rows of its product and unit, of which there is
+one per day with movements.
+
+Both tables are maintained through the add_/remove_ hooks in
+app.database.aggregates that the write paths already call.
+"""
+from sqlalchemy import text
+from app.utils.helpers import cached_fetchall
+
+# Movements of the given rows, one per row: (source_id, product_id, unit,
+# event_date, produced, sold)
+_MOVEMENTS = {
+    "production": """
+        SELECT id AS source_id, product_id, unit,
+               production_date AS event_date, quantity AS produced, 0 AS sold
+        FROM inventory
+        WHERE id = ANY(:ids) AND product_id IS NOT NULL
+    """,
+    "sale": """
+        SELECT id AS source_id, product_id, unit,
+               sale_date::date AS event_date, 0 AS produced, quantity AS sold
+        FROM sales
+        WHERE id = ANY(:ids) AND product_id IS NOT NULL
+    """,
+}
+
+def apply_stock_movements(db, source, ids, sign):
+    """Add (sign=1) or reverse (sign=-1) the stock movements of inventory
+    (source="production") or sales (source="sale") rows"""
+    movements = _MOVEMENTS[source]
+    params = {"ids": list(ids), "sign": sign, "source": source}
+
+    # Serialize balance updates per product, so concurrent writes on the
+    # same product cannot carry forward a stale balance
+    db.execute(text(f"""
+        SELECT pg_advisory_xact_lock(hashtext('stock_balance'), product_id)
+        FROM (SELECT DISTINCT product_id FROM ({movements}) m ORDER BY product_id) locked
+    """), params)
+
+    db.execute(text(f"""
+        INSERT INTO stock_ledger (product_id, unit, event_date, quantity, source, source_id)
+        SELECT product_id, unit, event_date, :sign * (produced - sold), :source, source_id
+        FROM ({movements}) m
+    """), params)
+
+    # Days without a balance row start from the closing balance of the
+    # day before them
+    db.execute(text(f"""
+        INSERT INTO stock_balance (product_id, unit, balance_date, balance)
+        SELECT
+            d.product_id, d.unit, d.event_date,
+            COALESCE((
+                SELECT b.balance FROM stock_balance b
+                WHERE b.product_id = d.product_id
+                AND b.unit = d.unit
+                AND b.balance_date < d.event_date
+                ORDER BY b.balance_date DESC
+                LIMIT 1
+            ), 0)
+        FROM (SELECT DISTINCT product_id, unit, event_date FROM ({movements}) m) d
+        ON CONFLICT (product_id, unit, balance_date) DO NOTHING
+    """), params)
+
+    # Add each day's movements to that day and to every later balance
+    db.execute(text(f"""
+        WITH changes AS (
+            SELECT product_id, unit, event_date,
+                   :sign * SUM(produced) AS produced,
+                   :sign * SUM(sold) AS sold
+            FROM ({movements}) m
+            GROUP BY product_id, unit, event_date
+        ),
+        shifted AS (
+            SELECT
+                b.product_id, b.unit, b.balance_date,
+                COALESCE(SUM(c.produced) FILTER (WHERE c.event_date = b.balance_date), 0) AS produced,
+                COALESCE(SUM(c.sold) FILTER (WHERE c.event_date = b.balance_date), 0) AS sold,
+                SUM(c.produced - c.sold) AS net
+            FROM stock_balance b
+            JOIN changes c
+                ON c.product_id = b.product_id
+                AND c.unit = b.unit
+                AND c.event_date <= b.balance_date
+            GROUP BY b.product_id, b.unit, b.balance_date
+        )
+        UPDATE stock_balance b
+        SET produced = b.produced + s.produced,
+            sold = b.sold + s.sold,
+            balance = b.balance + s.net
+        FROM shifted s
+        WHERE b.product_id = s.product_id
+        AND b.unit = s.unit
+        AND b.balance_date = s.balance_date
+    """), params)
+
+    # Drop days whose last movement was reversed; their balance is the
+    # same as the day before
+    db.execute(text(f"""
+        DELETE FROM stock_balance b
+        USING (SELECT DISTINCT product_id, unit, event_date FROM ({movements}) m) d
+        WHERE b.product_id = d.product_id
+        AND b.unit = d.unit
+        AND b.balance_date = d.event_date
+        AND b.produced = 0
+        AND b.sold = 0
+    """), params)
+
+def rebuild_stock(db):
+    """Re-record every current batch and order line and recompute the balances"""
+    # Projection snapshots point into the ledger being replaced; pages fall
+    # back to the balances until the next snapshot is taken
+    db.execute(text("DELETE FROM projection_snapshots"))
+    db.execute(text("TRUNCATE stock_ledger, stock_balance"))
+    db.execute(text("""
+        INSERT INTO stock_ledger (product_id, unit, event_date, quantity, source, source_id)
+        SELECT product_id, unit, production_date, quantity, 'production', id
+        FROM inventory
+        WHERE product_id IS NOT NULL
+        UNION ALL
+        SELECT product_id, unit, sale_date::date, -quantity, 'sale', id
+        FROM sales
+        WHERE product_id IS NOT NULL
+    """))
+    db.execute(text("""
+        INSERT INTO stock_balance (product_id, unit, balance_date, produced, sold, balance)
+        SELECT
+            product_id,
+            unit,
+            event_date,
+            COALESCE(SUM(quantity) FILTER (WHERE source = 'production'), 0),
+            COALESCE(-SUM(quantity) FILTER (WHERE source = 'sale'), 0),
+            SUM(SUM(quantity)) OVER (PARTITION BY product_id, unit ORDER BY event_date)
+        FROM stock_ledger
+        GROUP BY product_id, unit, event_date
+    """))
+
+def get_stock_balance(db, product_id, unit, as_of):
+    """Stock of a product in a unit at the end of a date"""
+    balance = db.execute(text("""
+        SELECT balance FROM stock_balance
+        WHERE product_id = :product_id
+        AND unit = :unit
+        AND balance_date <= :as_of
+        ORDER BY balance_date DESC
+        LIMIT 1
+    """), {"product_id": product_id, "unit": unit, "as_of": as_of}).scalar()
+    return balance if balance is not None else 0
+
+def stock_levels_query(start_date, after=None, limit=None):
+    """Current stock per product, the latest maintained balance of each unit,
+    as (query, params); after and limit select one keyset page by product id"""
+    query = """
+        SELECT p.id, p.name, p.description, c.name as category,
+               COALESCE(SUM(b.balance), 0) as current_stock,
+               COALESCE(MIN(b.unit), 'L') as unit
+        FROM products p
+        JOIN categories c ON p.category = c.name
+        LEFT JOIN LATERAL (
+            SELECT DISTINCT ON (unit) unit, balance
+            FROM stock_balance
+            WHERE product_id = p.id
+            AND balance_date <= :start_date
+            ORDER BY unit, balance_date DESC
+        ) b ON TRUE
+    """
+    params = {"start_date": start_date}
+
+    if after is not None:
+        query += " WHERE p.id > :after"
+        params["after"] = after
+
+    query += " GROUP BY p.id, p.name, p.description, c.name ORDER BY p.id"
+
+    if limit is not None:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+
+    return text(query), params
+
+def stock_changes_query(start_date, end_date, product_ids=None):
+    """Daily production and sales after start_date up to end_date from the
+    balances, as (query, params), optionally only for some products"""
+    query = """
+        SELECT product_id,
+               balance_date as date,
+               SUM(produced) as produced,
+               SUM(sold) as sold
+        FROM stock_balance
+        WHERE balance_date > :start_date
+        AND balance_date <= :end_date
+    """
+    params = {"start_date": start_date, "end_date": end_date}
+
+    if product_ids is not None:
+        query += " AND product_id = ANY(:product_ids)"
+        params["product_ids"] = list(product_ids)
+
+    query += " GROUP BY product_id, balance_date ORDER BY balance_date"
+    return text(query), params
+
+def get_stock_levels(db, start_date, end_date, after=None, limit=None):
+    """Stock of each product at the end of start_date and its production
+    and sales up to end_date
+
+    Returns a dict of product id -> product details, 'current_stock' and
+    'future_production'/'future_sales' lists of {'date', 'quantity'}, in
+    product id order. after and limit fetch one keyset page of products.
+    """
+    query, params = stock_levels_query(start_date, after, limit)
+    products = cached_fetchall(db, query, params,
+                               tables=("products", "categories", "inventory", "sales"))
+
+    stock_data = {}
+    for product in products:
+        stock_data[product.id] = {
+            'id': product.id,
+            'name': product.name,
+            'description': product.description,
+            'category': product.category,
+            'current_stock': product.current_stock,
+            'unit': product.unit,
+            'future_production': [],
+            'future_sales': []
+        }
+    if not stock_data or end_date <= start_date:
+        return stock_data
+
+    paged = after is not None or limit is not None
+    query, params = stock_changes_query(start_date, end_date, list(stock_data) if paged else None)
+    for change in cached_fetchall(db, query, params, tables=("inventory", "sales")):
+        data = stock_data.get(change.product_id)
+        if data is None:
+            continue
+        if change.produced:
+            data['future_production'].append({'date': change.date, 'quantity': change.produced})
+        if change.sold:
+            data['future_sales'].append({'date': change.date, 'quantity': change.sold})
+
+    return stock_data
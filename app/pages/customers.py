@@ -1,6 +1,16 @@
 import streamlit as st
 from sqlalchemy import text
 import pandas as pd
+from app.utils.helpers import cached_fetchall, invalidate
+
+# Delete guard: whether the customer has orders, and how many the rollup counts
+CUSTOMER_USAGE_QUERY = text("""
+    SELECT
+        EXISTS (SELECT 1 FROM sales WHERE customer_id = :id) as has_sales,
+        COALESCE(
+            (SELECT order_lines FROM customer_sales_rollup WHERE customer_id = :id), 0
+        ) as sales_count
+""")
 
 def show_customers(db):
     """Display all customers"""
@@ -10,7 +20,7 @@ def show_customers(db):
             FROM customers
             ORDER BY name
         """)
-        customers = db.execute(query).fetchall()
+        customers = cached_fetchall(db, query, tables=("customers",))
         
         if customers:
             st.write("### All Customers")
@@ -53,6 +63,7 @@ def new_customer_form(db):
                         {"name": name, "contact_info": contact_info}
                     )
                     db.commit()
+                    invalidate("customers")
                     st.success("Customer added successfully!")
                     st.rerun()
             except Exception as e:
@@ -66,11 +77,11 @@ def edit_delete_customer(db):
     st.subheader("Edit or Delete Customer")
     
     # Get all customers for selection
-    customers = db.execute(text("""
+    customers = cached_fetchall(db, text("""
         SELECT id, name, contact_info 
         FROM customers 
         ORDER BY name
-    """)).fetchall()
+    """), tables=("customers",))
     
     if customers:
         customer_options = {c.name: (c.id, c.contact_info) for c in customers}
@@ -101,6 +112,7 @@ def edit_delete_customer(db):
                             "id": customer_id
                         })
                         db.commit()
+                        invalidate("customers")
                         st.success("Customer updated successfully!")
                         st.rerun()
                     except Exception as e:
@@ -108,12 +120,9 @@ def edit_delete_customer(db):
                         st.error(f"Error updating customer: {str(e)}")
             
             with col2:
-                # Check if customer has any sales before allowing deletion
-                sales = db.execute(text("""
-                    SELECT COUNT(*) as count
-                    FROM sales
-                    WHERE customer_id = :id
-                """), {"id": customer_id}).scalar()
+                # Check if customer has any sales before allowing deletion;
+                # the count shown comes from the maintained revenue rollup
+                usage = db.execute(CUSTOMER_USAGE_QUERY, {"id": customer_id}).fetchone()
                 
                 delete_confirmed = st.checkbox(
                     "I confirm I want to delete this customer",
@@ -124,13 +133,13 @@ def edit_delete_customer(db):
                     "Delete Customer",
                     key="delete_customer",
                     type="secondary",
-                    disabled=sales > 0
+                    disabled=usage.has_sales
                 )
                 
-                if sales > 0:
+                if usage.has_sales:
                     st.warning(
                         "This customer cannot be deleted because they have "
-                        f"{sales} sales records"
+                        f"{usage.sales_count} sales records"
                     )
                 
                 if delete_confirmed and delete_button:
@@ -140,26 +149,25 @@ def edit_delete_customer(db):
                             {"id": customer_id}
                         )
                         db.commit()
+                        invalidate("customers")
                         st.success("Customer deleted successfully!")
                         st.rerun()
                     except Exception as e:
                         db.rollback()
                         st.error(f"Error deleting customer: {str(e)}")
 
-def search_customers(db):
-    st.subheader("Search Customers")
-    
-    search_term = st.text_input("Search by Name or Contact Info")
-    
+def customer_search_query(search_term=None):
+    """Build the customer search query and its parameters"""
+    # Order counts and revenue come from the maintained per-customer rollup
     query = """
         SELECT 
             c.id,
             c.name,
             c.contact_info,
-            COUNT(DISTINCT s.id) as total_orders,
-            SUM(s.quantity * s.price_per_unit) as total_revenue
+            COALESCE(r.order_lines, 0) as total_orders,
+            r.revenue as total_revenue
         FROM customers c
-        LEFT JOIN sales s ON c.id = s.customer_id
+        LEFT JOIN customer_sales_rollup r ON r.customer_id = c.id
         WHERE 1=1
     """
     params = {}
@@ -173,10 +181,17 @@ def search_customers(db):
         """
         params["search"] = f"%{search_term}%"
     
-    query += " GROUP BY c.id, c.name, c.contact_info ORDER BY c.name"
+    query += " ORDER BY c.name"
+    return text(query), params
+
+def search_customers(db):
+    st.subheader("Search Customers")
+    
+    search_term = st.text_input("Search by Name or Contact Info")
+    query, params = customer_search_query(search_term)
     
     try:
-        results = db.execute(text(query), params).fetchall()
+        results = cached_fetchall(db, query, params, tables=("customers", "sales"))
         if results:
             df = pd.DataFrame([{
                 "ID": r.id,
@@ -1,37 +1,45 @@
 import streamlit as st
 from sqlalchemy import text
-import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
+import numpy as np
 import pandas as pd
+from app.database.batches import expiry_buckets, get_expiring_batches
+from app.database.projections import PROJECTION_WEEKS, get_projection
+from app.database.stock import get_stock_levels
+from app.utils.buckets import (
+    GRANULARITIES, bucket_labels, bucket_start, bucket_totals, horizon_end
+)
+from app.utils.helpers import cached_fetchall
 
-def get_monthly_revenues(db):
-    """Get revenue for current month and next 6 months"""
+# Default and largest horizons of the projection sections, in buckets
+STOCK_PERIODS = {"day": 60, "week": PROJECTION_WEEKS, "month": 6}
+EXPIRY_PERIODS = {"day": 30, "week": 15, "month": 4}
+MAX_PERIODS = {"day": 366, "week": 104, "month": 24}
+
+# Revenue per day from the maintained daily aggregate
+REVENUE_QUERY = text("""
+    SELECT sale_day, SUM(revenue) as revenue
+    FROM sales_daily_agg
+    WHERE sale_day BETWEEN :start_date AND :end_date
+    GROUP BY sale_day
+""")
+
+def get_revenue_projection(db, periods=7, granularity="month"):
+    """Get revenue per bucket for the current bucket and the ones after it"""
     try:
-        query = text("""
-            WITH RECURSIVE months AS (
-                SELECT 
-                    DATE_TRUNC('month', CURRENT_DATE) as month_start,
-                    DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month' - INTERVAL '1 day' as month_end
-                UNION ALL
-                SELECT 
-                    month_start + INTERVAL '1 month',
-                    month_end + INTERVAL '1 month'
-                FROM months
-                WHERE month_start < DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '6 months'
-            )
-            SELECT 
-                months.month_start,
-                COALESCE(SUM(s.quantity * s.price_per_unit), 0) as revenue
-            FROM months
-            LEFT JOIN sales s ON DATE_TRUNC('month', s.sale_date) = months.month_start
-            GROUP BY months.month_start
-            ORDER BY months.month_start
-        """)
+        today = date.today()
+        results = cached_fetchall(db, REVENUE_QUERY, {
+            "start_date": bucket_start(today, granularity),
+            "end_date": horizon_end(today, periods, granularity)
+        }, tables=("sales",))
         
-        results = db.execute(query).fetchall()
-        return [(r.month_start, float(r.revenue)) for r in results]
+        totals = bucket_totals(
+            [r.sale_day for r in results], [r.revenue for r in results],
+            today, periods, granularity
+        )[0]
+        return list(zip(bucket_labels(today, periods, granularity), totals.tolist()))
     except Exception as e:
-        st.error(f"Error fetching monthly revenues: {str(e)}")
+        st.error(f"Error fetching revenue projection: {str(e)}")
         return []
 
 def get_daily_revenue_current_month(db):
@@ -39,16 +47,17 @@ def get_daily_revenue_current_month(db):
     try:
         query = text("""
             SELECT 
-                sale_date::date,
-                COALESCE(SUM(quantity * price_per_unit), 0) as revenue
-            FROM sales 
-            WHERE DATE_TRUNC('month', sale_date) = DATE_TRUNC('month', CURRENT_DATE)
-            GROUP BY sale_date
-            ORDER BY sale_date
+                sale_day,
+                COALESCE(SUM(revenue), 0) as revenue
+            FROM sales_daily_agg
+            WHERE sale_day >= DATE_TRUNC('month', CURRENT_DATE)::date
+            AND sale_day < (DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month')::date
+            GROUP BY sale_day
+            ORDER BY sale_day
         """)
-        results = db.execute(query).fetchall()
+        results = cached_fetchall(db, query, tables=("sales",))
         
-        days = [r.sale_date for r in results]
+        days = [r.sale_day for r in results]
         revenues = [float(r.revenue) for r in results]
         
         return days, revenues
@@ -56,221 +65,207 @@ def get_daily_revenue_current_month(db):
         st.error(f"Error fetching daily revenue: {str(e)}")
         return [], []
 
-def create_weekly_stock_matrix(stock_data, start_date, search_term=None):
-    """Create a matrix of weekly stock levels with search functionality"""
-    weekly_data = []
-    current_week = int(start_date.strftime('%V'))
+def _search_products(products, search_term):
+    """Keep the products whose ID, name, description or category contains the search term"""
+    if not search_term:
+        return products
+    haystack = (
+        products['Product ID'] +
+        products['Product'].fillna('') +
+        products['Description'].fillna('') +
+        products['Category'].fillna('')
+    ).str.lower()
+    return products[haystack.str.contains(search_term.lower(), regex=False)]
+
+def _stock_matrix(products, levels, start_date, periods, granularity):
+    """Lay out per-product stock levels per bucket as columns next to the products"""
+    buckets = pd.DataFrame(
+        levels,
+        columns=bucket_labels(start_date, periods, granularity),
+        index=products.index
+    )
+    matrix = pd.concat([products.drop(columns='Description'), buckets], axis=1)
+    return matrix.reset_index(drop=True)
+
+def create_stock_matrix(stock_data, start_date, search_term=None, periods=26, granularity="week"):
+    """Create a matrix of stock levels at the end of each bucket with search functionality"""
+    if not stock_data:
+        return pd.DataFrame()
     
-    # Get the start of current week (Monday)
-    week_start = start_date - timedelta(days=start_date.weekday())
+    products = pd.DataFrame({
+        'Product ID': [str(data['id']) for data in stock_data.values()],
+        'Product': [data['name'] for data in stock_data.values()],
+        'Category': [data['category'] for data in stock_data.values()],
+        'Description': [data['description'] for data in stock_data.values()],
+        'Current Stock': [float(data['current_stock']) for data in stock_data.values()]
+    })
     
-    for product_id, data in stock_data.items():
-        # Apply search filter if provided
-        if search_term and search_term.lower() not in (
-            str(data['id']).lower() + 
-            data['name'].lower() + 
-            data['description'].lower() + 
-            data['category'].lower()
-        ):
-            continue
-            
-        current_stock = data['current_stock']
-        
-        row_data = {
-            'Product ID': str(data['id']),
-            'Product': data['name'],
-            'Category': data['category'],
-            'Current Stock': f"{current_stock}"
-        }
-        
-        # Calculate weekly stock levels
-        week_date = week_start
-        for week in range(26):
-            week_end = week_date + timedelta(days=6)
-            
-            # Add production for this week
-            production = sum(
-                p['quantity'] for p in data['future_production']
-                if week_date <= p['date'] <= week_end
-            )
-            
-            # Subtract sales for this week
-            sales = sum(
-                s['quantity'] for s in data['future_sales']
-                if week_date <= s['date'] <= week_end
-            )
-            
-            current_stock += production - sales
-            row_data[f'Week {week + current_week}'] = f"{current_stock}"
-            
-            week_date += timedelta(days=7)
-        
-        weekly_data.append(row_data)
+    # Apply search filter if provided
+    products = _search_products(products, search_term)
+    if products.empty:
+        return pd.DataFrame()
     
-    return pd.DataFrame(weekly_data)
-
+    # Flatten all future changes into (row, date, delta) event arrays
+    rows, dates, deltas = [], [], []
+    for row, data in enumerate(stock_data.values()):
+        for p in data['future_production']:
+            rows.append(row)
+            dates.append(p['date'])
+            deltas.append(float(p['quantity']))
+        for s in data['future_sales']:
+            rows.append(row)
+            dates.append(s['date'])
+            deltas.append(-float(s['quantity']))
+    
+    # Sum the events into buckets and accumulate them per product
+    changes = bucket_totals(dates, deltas, start_date, periods, granularity,
+                            rows=rows, num_rows=len(stock_data))
+    levels = np.cumsum(changes, axis=1)[products.index.to_numpy()]
+    levels += products['Current Stock'].to_numpy()[:, None]
+    
+    return _stock_matrix(products, levels, start_date, periods, granularity)
 
-def calculate_stock_levels(db, start_date, end_date):
-    """Calculate current stock levels and future changes"""
+def get_stock_matrix(db, start_date, search_term=None, periods=PROJECTION_WEEKS, granularity="week"):
+    """Stock matrix from the day's projection snapshot plus the movements
+    recorded since, or computed from the balances when there is no snapshot
+    for the horizon"""
     try:
-        # Get all products
-        products_query = text("""
+        projection = None
+        if granularity == "week":
+            projection = get_projection(db, start_date, periods)
+        if projection is None:
+            end_date = horizon_end(start_date, periods, granularity)
+            stock_data = calculate_stock_levels(db, start_date, end_date)
+            return create_stock_matrix(stock_data, start_date, search_term, periods, granularity)
+        
+        query = text("""
             SELECT p.id, p.name, p.description, c.name as category
             FROM products p
             JOIN categories c ON p.category = c.name
             ORDER BY p.id
         """)
-        products = db.execute(products_query).fetchall()
+        results = cached_fetchall(db, query, tables=("products", "categories"))
+        if not results:
+            return pd.DataFrame()
         
-        stock_data = {}
-        for product in products:
-            # Get production data
-            prod_query = text("""
-                SELECT SUM(quantity) as total_production, unit
-                FROM inventory
-                WHERE product_id = :product_id
-                AND production_date <= :today
-                GROUP BY unit
-            """)
-            production = db.execute(prod_query, {
-                "product_id": product.id,
-                "today": start_date
-            }).fetchone()
-            
-            # Get sales data
-            sales_query = text("""
-                SELECT SUM(quantity) as total_sales, unit
-                FROM sales
-                WHERE product_id = :product_id
-                AND sale_date <= :today
-                GROUP BY unit
-            """)
-            sales = db.execute(sales_query, {
-                "product_id": product.id,
-                "today": start_date
-            }).fetchone()
-            
-            # Get future production
-            future_prod_query = text("""
-                SELECT production_date::date as date,
-                       SUM(quantity) as quantity,
-                       unit
-                FROM inventory
-                WHERE product_id = :product_id
-                AND production_date > :start_date
-                AND production_date <= :end_date
-                GROUP BY production_date, unit
-                ORDER BY production_date
-            """)
-            future_production = db.execute(future_prod_query, {
-                "product_id": product.id,
-                "start_date": start_date,
-                "end_date": end_date
-            }).fetchall()
-            
-            # Get future sales
-            future_sales_query = text("""
-                SELECT sale_date::date as date,
-                       SUM(quantity) as quantity,
-                       unit
-                FROM sales
-                WHERE product_id = :product_id
-                AND sale_date > :start_date
-                AND sale_date <= :end_date
-                GROUP BY sale_date, unit
-                ORDER BY sale_date
-            """)
-            future_sales = db.execute(future_sales_query, {
-                "product_id": product.id,
-                "start_date": start_date,
-                "end_date": end_date
-            }).fetchall()
-            
-            # Calculate current stock
-            current_stock = (production.total_production if production else 0) - \
-                          (sales.total_sales if sales else 0)
-            
-            stock_data[product.id] = {
-                'id': product.id,
-                'name': product.name,
-                'description': product.description,
-                'category': product.category,
-                'current_stock': current_stock,
-                'unit': production.unit if production else 'L',  # default to liters
-                'future_production': [
-                    {'date': p.date, 'quantity': p.quantity} 
-                    for p in future_production
-                ],
-                'future_sales': [
-                    {'date': s.date, 'quantity': s.quantity} 
-                    for s in future_sales
-                ]
-            }
+        empty = {'current_stock': 0, 'weekly_stock': [0] * periods}
+        stock = [projection.get(r.id, empty) for r in results]
+        products = pd.DataFrame({
+            'Product ID': [str(r.id) for r in results],
+            'Product': [r.name for r in results],
+            'Category': [r.category for r in results],
+            'Description': [r.description for r in results],
+            'Current Stock': [float(s['current_stock']) for s in stock]
+        })
+        products = _search_products(products, search_term)
+        if products.empty:
+            return pd.DataFrame()
         
-        return stock_data
+        levels = np.array(
+            [[float(level) for level in stock[row]['weekly_stock']] for row in products.index],
+            dtype=float
+        ).reshape(len(products), periods)
+        return _stock_matrix(products, levels, start_date, periods, granularity)
+    except Exception as e:
+        st.error(f"Error loading stock projection: {str(e)}")
+        return pd.DataFrame()
+
+def calculate_stock_levels(db, start_date, end_date):
+    """Calculate current stock levels and future changes for all products"""
+    try:
+        return get_stock_levels(db, start_date, end_date)
     except Exception as e:
         st.error(f"Error calculating stock levels: {str(e)}")
         return {}
 
-def get_low_stock_products(stock_data):
-    """Find products that will have negative stock"""
-    low_stock = []
-    
-    for product_id, data in stock_data.items():
-        current_stock = data['current_stock']
-        min_stock = current_stock
-        
-        # Create a timeline of all stock changes
-        timeline = []
-        for prod in data['future_production']:
-            timeline.append((prod['date'], prod['quantity']))
-        for sale in data['future_sales']:
-            timeline.append((sale['date'], -sale['quantity']))
-        
-        # Sort timeline by date
-        timeline.sort(key=lambda x: x[0])
-        
-        # Calculate running stock level
-        for _, change in timeline:
-            current_stock += change
-            min_stock = min(min_stock, current_stock)
-        
-        if min_stock < 0:
-            low_stock.append({
-                'Product ID': data['id'],
-                'Product': data['name'],
-                'Category': data['category'],
-                'Current Stock': f"{data['current_stock']} {data['unit']}",
-                'Minimum Future Stock': f"{min_stock} {data['unit']}"
-            })
+def get_low_stock_products(db, start_date, end_date):
+    """Find products whose projected stock goes negative before end_date
     
-    return pd.DataFrame(low_stock) if low_stock else pd.DataFrame()
-
-def get_expiring_products(db):
-    """Get products expiring within 30 days"""
+    The running stock per product is computed in SQL from the maintained
+    balances, so only the offending products are returned, with the first
+    date their stock is negative.
+    """
     try:
         query = text("""
-            SELECT 
-                p.id,
-                p.name,
-                p.description,
-                c.name as category,
-                i.quantity,
-                i.unit,
-                i.expiry_date
-            FROM inventory i
-            JOIN products p ON i.product_id = p.id
+            WITH opening AS (
+                SELECT p.id as product_id,
+                       COALESCE(SUM(b.balance), 0) as stock,
+                       COALESCE(MIN(b.unit), 'L') as unit
+                FROM products p
+                LEFT JOIN LATERAL (
+                    SELECT DISTINCT ON (unit) unit, balance
+                    FROM stock_balance
+                    WHERE product_id = p.id
+                    AND balance_date <= :start_date
+                    ORDER BY unit, balance_date DESC
+                ) b ON TRUE
+                GROUP BY p.id
+            ),
+            changes AS (
+                SELECT product_id, balance_date, SUM(produced - sold) as net
+                FROM stock_balance
+                WHERE balance_date > :start_date
+                AND balance_date <= :end_date
+                GROUP BY product_id, balance_date
+            ),
+            projected AS (
+                SELECT o.product_id,
+                       c.balance_date,
+                       o.stock + SUM(c.net) OVER (
+                           PARTITION BY o.product_id ORDER BY c.balance_date
+                       ) as stock
+                FROM opening o
+                JOIN changes c ON c.product_id = o.product_id
+            ),
+            lows AS (
+                SELECT o.product_id,
+                       o.stock as current_stock,
+                       o.unit,
+                       LEAST(o.stock, MIN(pr.stock)) as min_stock,
+                       CASE
+                           WHEN o.stock < 0 THEN CAST(:start_date AS DATE)
+                           ELSE MIN(pr.balance_date) FILTER (WHERE pr.stock < 0)
+                       END as negative_from
+                FROM opening o
+                LEFT JOIN projected pr ON pr.product_id = o.product_id
+                GROUP BY o.product_id, o.stock, o.unit
+            )
+            SELECT p.id, p.name, c.name as category,
+                   l.current_stock, l.min_stock, l.unit, l.negative_from
+            FROM lows l
+            JOIN products p ON p.id = l.product_id
             JOIN categories c ON p.category = c.name
-            WHERE i.expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '30 days'
-            AND i.quantity > 0
-            ORDER BY i.expiry_date
+            WHERE l.min_stock < 0
+            ORDER BY l.negative_from, p.id
         """)
+        results = cached_fetchall(db, query, {
+            "start_date": start_date,
+            "end_date": end_date
+        }, tables=("products", "categories", "inventory", "sales"))
         
-        results = db.execute(query).fetchall()
+        if results:
+            return pd.DataFrame([{
+                'Product ID': r.id,
+                'Product': r.name,
+                'Category': r.category,
+                'Current Stock': f"{r.current_stock} {r.unit}",
+                'Minimum Future Stock': f"{r.min_stock} {r.unit}",
+                'Negative From': r.negative_from.strftime('%Y-%m-%d')
+            } for r in results])
+        return pd.DataFrame()
+    except Exception as e:
+        st.error(f"Error finding low stock products: {str(e)}")
+        return pd.DataFrame()
+
+def get_expiring_products(db):
+    """Get products expiring within 30 days"""
+    try:
+        today = date.today()
+        results = get_expiring_batches(db, today, today + timedelta(days=30))
         
         if results:
             return pd.DataFrame([{
-                'Product ID': str(r.id),
+                'Product ID': str(r.product_id),
                 'Product': r.name,
                 'Category': r.category,
                 'Quantity': f"{r.quantity} {r.unit}",
@@ -281,103 +276,46 @@ def get_expiring_products(db):
         st.error(f"Error fetching expiring products: {str(e)}")
         return pd.DataFrame()
 
-def get_weekly_expiry(db, num_weeks=15):
-    """Calculate weekly expiring quantities using FIFO principle with product details"""
+def get_expiry_buckets(db, periods=15, granularity="week"):
+    """Calculate expiring quantities per bucket using FIFO principle with product details"""
     try:
-        start_date = datetime.now().date()
-        current_week = int(start_date.strftime('%V'))
-        end_date = start_date + timedelta(weeks=num_weeks)
-        
-        query = text("""
-            WITH ProductionAndSales AS (
-                SELECT 
-                    p.id as product_id,
-                    p.name,
-                    p.description,
-                    c.name as category,
-                    i.production_date,
-                    i.expiry_date,
-                    i.quantity as prod_quantity,
-                    i.unit,
-                    COALESCE((
-                        SELECT SUM(s.quantity)
-                        FROM sales s
-                        WHERE s.product_id = p.id
-                        AND s.sale_date BETWEEN i.production_date AND i.expiry_date
-                    ), 0) as sold_quantity
-                FROM inventory i
-                JOIN products p ON i.product_id = p.id
-                JOIN categories c ON p.category = c.name
-                WHERE i.expiry_date BETWEEN :start_date AND :end_date
-            )
-            SELECT 
-                product_id,
-                name,
-                description,
-                category,
-                expiry_date,
-                GREATEST(prod_quantity - sold_quantity, 0) as remaining_quantity,
-                unit
-            FROM ProductionAndSales
-            WHERE prod_quantity - sold_quantity > 0
-            ORDER BY expiry_date
-        """)
-        
-        results = db.execute(query, {
-            "start_date": start_date,
-            "end_date": end_date
-        }).fetchall()
-        
-        # Create week buckets using actual week numbers
-        weeks = []
-        quantities = []
-        weekly_details = {}  # Store product details for each week
-        
-        for week_offset in range(num_weeks):
-            week_num = current_week + week_offset
-            if week_num > 52:
-                week_num -= 52
-            
-            week_start = start_date + timedelta(weeks=week_offset)
-            week_end = week_start + timedelta(days=6)
-            
-            # Get products expiring this week
-            week_products = [
-                {
-                    'Product ID': str(r.product_id),
-                    'Product': r.name,
-                    'Category': r.category,
-                    'Quantity': f"{r.remaining_quantity} {r.unit}",
-                    'Expiry Date': r.expiry_date.strftime('%Y-%m-%d')
-                }
-                for r in results
-                if week_start <= r.expiry_date <= week_end
-            ]
-            
-            week_quantity = sum(
-                r.remaining_quantity 
-                for r in results 
-                if week_start <= r.expiry_date <= week_end
-            )
-            
-            week_label = f"Week {week_num}"
-            weeks.append(week_label)
-            quantities.append(float(week_quantity))
-            weekly_details[week_label] = week_products
-        
-        return weeks, quantities, weekly_details
-        
+        return expiry_buckets(db, datetime.now().date(), periods, granularity)
     except Exception as e:
         st.error(f"Error calculating expiry data: {str(e)}")
         return [], [], {}
 
+def _projection_controls(key, default_periods):
+    """Bucket size and horizon inputs for a projection section"""
+    col1, col2 = st.columns(2)
+    with col1:
+        granularity = st.selectbox(
+            "Group by",
+            options=GRANULARITIES,
+            index=GRANULARITIES.index("week"),
+            format_func=str.title,
+            key=f"{key}_granularity"
+        )
+    with col2:
+        # Keyed per granularity, so switching starts from that default
+        periods = st.number_input(
+            f"Horizon ({granularity}s)",
+            min_value=1,
+            max_value=MAX_PERIODS[granularity],
+            value=default_periods[granularity],
+            key=f"{key}_periods_{granularity}"
+        )
+    return granularity, int(periods)
+
 def show():
     """Main overview page"""
+    # Imported on first render, so loading the module does not pay for plotly
+    import plotly.graph_objects as go
+
     st.title("Overview")
     
     try:
         # Get monthly revenues
-        monthly_revenues = get_monthly_revenues(st.session_state.db)
+        monthly_revenues = get_revenue_projection(st.session_state.db)
         
         if monthly_revenues:
             # Create two columns with different widths
@@ -397,8 +335,8 @@ def show():
                 st.subheader("Monthly Revenue Projection")
                 # Create dictionary with months as columns
                 revenue_dict = {
-                    r[0].strftime("%b %Y"): f"${int(r[1]):,}" 
-                    for r in monthly_revenues
+                    label: f"${int(revenue):,}" 
+                    for label, revenue in monthly_revenues
                 }
                 # Convert to DataFrame with a single row
                 revenue_df = pd.DataFrame([revenue_dict])
@@ -449,12 +387,9 @@ def show():
         start_date = datetime.now().date()
         end_date = start_date + timedelta(weeks=26)
         
-        # Get stock data
-        stock_data = calculate_stock_levels(st.session_state.db, start_date, end_date)
-        
         # Low Stock Alert
         st.header("Low Stock Alert")
-        low_stock_df = get_low_stock_products(stock_data)
+        low_stock_df = get_low_stock_products(st.session_state.db, start_date, end_date)
         if not low_stock_df.empty:
             st.dataframe(
                 low_stock_df,
@@ -465,16 +400,18 @@ def show():
                     "Product": st.column_config.Column(width="medium"),
                     "Category": st.column_config.Column(width="medium"),
                     "Current Stock": st.column_config.Column(width="small"),
-                    "Minimum Future Stock": st.column_config.Column(width="small")
+                    "Minimum Future Stock": st.column_config.Column(width="small"),
+                    "Negative From": st.column_config.Column(width="small")
                 }
     )
         else:
             st.info("No products with projected negative stock levels")
 
 
-        # Weekly Expiring Stock graph
-        st.header("Weekly Expiring Stock")
-        weeks, quantities, weekly_details = get_weekly_expiry(st.session_state.db)
+        # Expiring Stock graph
+        st.header("Expiring Stock")
+        granularity, periods = _projection_controls("expiry", EXPIRY_PERIODS)
+        weeks, quantities, weekly_details = get_expiry_buckets(st.session_state.db, periods, granularity)
 
         if weeks and quantities:
             # Store the weekly details in session state
@@ -492,14 +429,14 @@ def show():
                     name='Expiring Stock',
                     marker_color='#E74C3C',
                     hovertemplate=(
-                        "<b>Week:</b> %{x}<br>" +
+                        f"<b>{granularity.title()}:</b> %{{x}}<br>" +
                         "<b>Expiring:</b> %{y:,.0f} kg<br>" +
                         "<extra></extra>"
                     )
                 ))
                 
                 fig.update_layout(
-                    xaxis_title="Week",
+                    xaxis_title=granularity.title(),
                     yaxis_title="Quantity (liters)",
                     height=300,
                     margin=dict(l=20, r=20, t=20, b=20),
@@ -509,7 +446,7 @@ def show():
                 
                 # Add week selection
                 selected_week = st.selectbox(
-                    "Select week to see details:",
+                    f"Select {granularity} to see details:",
                     options=weeks,
                     key="expiry_week_select"
                 )
@@ -545,18 +482,19 @@ def show():
                             df = pd.DataFrame(weekly_details[week])
                             st.dataframe(df, hide_index=True)
                         else:
-                            st.info("No products expiring this week")
+                            st.info(f"No products expiring this {granularity}")
         else:
-            st.info("No expiring stock in the next 15 weeks")
+            st.info(f"No expiring stock in the next {periods} {granularity}s")
 
 
-         # Weekly Stock Matrix
-        st.header("26-Week Stock Projection")
+         # Stock Matrix
+        st.header("Stock Projection")
+        granularity, periods = _projection_controls("stock", STOCK_PERIODS)
             
         # Add search functionality
         search_term = st.text_input("Search by ID, Product, or Category")
 
-        weekly_matrix = create_weekly_stock_matrix(stock_data, start_date, search_term)
+        weekly_matrix = get_stock_matrix(st.session_state.db, start_date, search_term, periods, granularity)
         if not weekly_matrix.empty:
             st.markdown("""
                 <style>
@@ -608,7 +546,11 @@ def show():
                 use_container_width=True,
                 column_config={
                     "ID": st.column_config.Column(width=40),  # Set explicit width for ID column
-                    "Product": st.column_config.Column(width=100)  # Set explicit width for Name column
+                    "Product": st.column_config.Column(width=100),  # Set explicit width for Name column
+                    **{
+                        col: st.column_config.NumberColumn(format="%.2f")
+                        for col in weekly_matrix.columns[3:]
+                    }
                 }
             )
         else:
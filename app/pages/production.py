@@ -2,6 +2,11 @@ import streamlit as st
 from datetime import datetime, timedelta
 from sqlalchemy import text
 import pandas as pd
+from app.database.models import production_frame, production_totals
+from app.database.production import delete_production, record_production, update_production
+from app.utils.catalog import get_catalog
+from app.utils.helpers import cached_fetchall, invalidate
+from app.utils.pagination import keyset_browser
 
 def initialize_production_state():
     """Initialize session state variables for multi-product production"""
@@ -38,33 +43,30 @@ def clear_current_production():
     """Clear the current production from session state"""
     st.session_state.current_production_items = []
 
-def show_recent_production(db, days_ago=30):
-    """Display recent production records"""
+def show_recent_production(db, days_ago=30, key="recent_production"):
+    """Display the production records of the last days_ago days a page at a time"""
     try:
-        query = text("""
-            SELECT i.id, i.production_date, i.expiry_date, p.name as product,
-                   c.name as category, i.quantity, i.unit
-            FROM inventory i
-            JOIN products p ON i.product_id = p.id
-            JOIN categories c ON p.category = c.name
-            WHERE i.production_date >= :start_date
-            ORDER BY i.production_date DESC, i.id DESC
-            LIMIT 10
-        """)
-        
-        start_date = datetime.now() - timedelta(days=days_ago)
-        production_records = db.execute(query, {"start_date": start_date}).fetchall()
+        start_date = datetime.now().date() - timedelta(days=days_ago)
+        st.write("### Recent Production")
+        production_records = keyset_browser(
+            db, key,
+            lambda db, after, limit: production_frame(
+                db, start_date, None, limit=limit, after=after
+            ),
+            cursor_columns=("production_date", "id"),
+            total_rows=None,
+            filters=(start_date,)
+        )
         
-        if production_records:
-            st.write("### Recent Production")
-            st.dataframe({
-                "ID": [r.id for r in production_records],
-                "Production Date": [r.production_date.strftime("%Y-%m-%d") for r in production_records],
-                "Expiry Date": [r.expiry_date.strftime("%Y-%m-%d") for r in production_records],
-                "Product": [r.product for r in production_records],
-                "Category": [r.category for r in production_records],
-                "Quantity": [f"{r.quantity} {r.unit}" for r in production_records],
-            })
+        if not production_records.empty:
+            st.dataframe(pd.DataFrame({
+                "ID": production_records["id"],
+                "Production Date": production_records["production_date"].map("{:%Y-%m-%d}".format),
+                "Expiry Date": production_records["expiry_date"].map("{:%Y-%m-%d}".format),
+                "Product": production_records["product"],
+                "Category": production_records["category"],
+                "Quantity": production_records["quantity"].astype(str) + " " + production_records["unit"]
+            }), hide_index=True)
         else:
             st.info("No recent production records found")
     except Exception as e:
@@ -92,16 +94,8 @@ def new_production_form(db):
     search_term = st.text_input("Search Product (ID, product, or category)", 
                                key="product_search_prod")
     if search_term:
-        products = db.execute(text("""
-            SELECT p.id, p.name, p.description, c.name as category_name, p.days_to_expiration
-            FROM products p 
-            JOIN categories c ON p.category = c.name
-            WHERE p.description ILIKE :search 
-            OR CAST(p.id AS TEXT) LIKE :search
-            OR c.name ILIKE :search
-            OR p.name ILIKE :search
-            ORDER BY p.description
-        """), {"search": f"%{search_term}%"}).fetchall()
+        catalog = get_catalog(db)
+        products = catalog.search(search_term)
         
         if products:
             product_options = [
@@ -135,8 +129,8 @@ def new_production_form(db):
                                                 st.session_state.production_date,
                                                 key="prod_date")
                 with col4:
-                    # Get days_to_expiration from products results
-                    days_to_expiration = next(p.days_to_expiration for p in products if p.id == product_id)
+                    # Get days_to_expiration from the catalog snapshot
+                    days_to_expiration = catalog.get(product_id).days_to_expiration
                     # Calculate expiry date based on production date and days_to_expiration
                     default_expiry = production_date + timedelta(days=days_to_expiration)
                     expiry_date = st.date_input("Expiry Date",
@@ -234,20 +228,10 @@ def new_production_form(db):
                         key="submit_prod_button", 
                         type="primary"):
                 try:
-                    # Insert each production item
-                    for item in st.session_state.current_production_items:
-                        db.execute(text("""
-                            INSERT INTO inventory 
-                            (product_id, quantity, unit, production_date, expiry_date)
-                            VALUES (:product_id, :quantity, :unit, :prod_date, :exp_date)
-                        """), {
-                            "product_id": item['product_id'],
-                            "quantity": item['quantity'],
-                            "unit": item['unit'],
-                            "prod_date": item['production_date'],
-                            "exp_date": item['expiry_date']
-                        })
+                    # Insert all production items in one statement
+                    record_production(db, st.session_state.current_production_items)
                     db.commit()
+                    invalidate("inventory")
                     st.success("Production batch recorded successfully!")
                     clear_current_production()
                     st.rerun()
@@ -264,7 +248,7 @@ def new_production_form(db):
 
     # Show recent production at the bottom
     st.markdown("---")
-    show_recent_production(db)
+    show_recent_production(db, key="new_production_recent")
 
 def edit_delete_production(db):
     """Interface for editing or deleting production records"""
@@ -321,20 +305,10 @@ def edit_delete_production(db):
                 with col3:
                     if st.button("Update Production", key="update_prod_button"):
                         try:
-                            db.execute(text("""
-                                UPDATE inventory
-                                SET quantity = :quantity, unit = :unit,
-                                    production_date = :prod_date,
-                                    expiry_date = :exp_date
-                                WHERE id = :prod_id
-                            """), {
-                                "quantity": new_quantity,
-                                "unit": new_unit,
-                                "prod_date": new_production_date,
-                                "exp_date": new_expiry_date,
-                                "prod_id": production_id
-                            })
+                            update_production(db, production.id, new_quantity, new_unit,
+                                              new_production_date, new_expiry_date)
                             db.commit()
+                            invalidate("inventory")
                             st.success("Production record updated successfully!")
                             st.rerun()
                         except Exception as e:
@@ -348,9 +322,9 @@ def edit_delete_production(db):
                                                     type="secondary",
                                                     key="delete_prod_button"):
                         try:
-                            db.execute(text("DELETE FROM inventory WHERE id = :prod_id"),
-                                     {"prod_id": production_id})
+                            delete_production(db, production.id)
                             db.commit()
+                            invalidate("inventory")
                             st.success("Production record deleted successfully!")
                             st.rerun()
                         except Exception as e:
@@ -363,7 +337,7 @@ def edit_delete_production(db):
     
     # Show recent production at the bottom
     st.markdown("---")
-    show_recent_production(db)
+    show_recent_production(db, key="edit_production_recent")
 
 def search_production(db):
     st.subheader("Search Production Records")
@@ -375,7 +349,9 @@ def search_production(db):
         end_date = st.date_input("End Date", key="search_prod_end_date")
     
     with col2:
-        categories = db.execute(text("SELECT name FROM categories ORDER BY name")).fetchall()
+        categories = cached_fetchall(
+            db, text("SELECT name FROM categories ORDER BY name"), tables=("categories",)
+        )
         category_options = [c.name for c in categories]
         category_options.insert(0, "All Categories")
         selected_category = st.selectbox(
@@ -387,60 +363,51 @@ def search_production(db):
     # Add product search field
     search_term = st.text_input("Search by Product Name", key="search_prod_name")
     
-    query = """
-        SELECT 
-            i.id,
-            i.production_date,
-            i.expiry_date,
-            p.name as product,
-            c.name as category,
-            i.quantity,
-            i.unit
-        FROM inventory i
-        JOIN products p ON i.product_id = p.id
-        JOIN categories c ON p.category = c.name
-        WHERE i.production_date BETWEEN :start_date AND :end_date
-    """
-    params = {"start_date": start_date, "end_date": end_date}
-    
-    if selected_category != "All Categories":
-        query += " AND c.name = :category"
-        params["category"] = selected_category
-    
-    if search_term:
-        query += " AND p.name ILIKE :search"
-        params["search"] = f"%{search_term}%"
-    
-    query += " ORDER BY i.production_date DESC"
-    
+    # Totals in SQL, then browse the rows a page at a time
     try:
-        results = db.execute(text(query), params).fetchall()
-        if results:
-            df = pd.DataFrame([{
-                "ID": r.id,
-                "Production Date": r.production_date.strftime("%Y-%m-%d"),
-                "Expiry Date": r.expiry_date.strftime("%Y-%m-%d"),
-                "Product": r.product,
-                "Category": r.category,
-                "Quantity": f"{r.quantity} {r.unit}"
-            } for r in results])
-            
-            st.dataframe(
-                df,
-                hide_index=True,
-                use_container_width=True,
-                column_config={
-                    "ID": st.column_config.Column(width="small"),
-                    "Production Date": st.column_config.Column(width="medium"),
-                    "Expiry Date": st.column_config.Column(width="medium"),
-                    "Product": st.column_config.Column(width="large"),
-                    "Category": st.column_config.Column(width="medium"),
-                    "Quantity": st.column_config.Column(width="medium")
-                }
+        filters = {
+            "category": None if selected_category == "All Categories" else selected_category,
+            "search_term": search_term
+        }
+        totals = production_totals(db, start_date, end_date, **filters)
+        if totals.count:
+            results = keyset_browser(
+                db, "search_production",
+                lambda db, after, limit: production_frame(
+                    db, start_date, end_date, limit=limit, after=after, **filters
+                ),
+                cursor_columns=("production_date", "id"),
+                total_rows=totals.count,
+                filters=(start_date, end_date, *filters.values())
             )
-            st.write(f"Found {len(results)} production records")
-            total_quantity = sum(r.quantity for r in results)
-            st.write(f"Total Production: {total_quantity:,.2f}")
+            if results.empty:
+                # Rows deleted since the page before was shown
+                st.info("No more production records; go back to the previous page")
+            else:
+                df = pd.DataFrame({
+                    "ID": results["id"],
+                    "Production Date": results["production_date"].map("{:%Y-%m-%d}".format),
+                    "Expiry Date": results["expiry_date"].map("{:%Y-%m-%d}".format),
+                    "Product": results["product"],
+                    "Category": results["category"],
+                    "Quantity": results["quantity"].astype(str) + " " + results["unit"]
+                })
+            
+                st.dataframe(
+                    df,
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        "ID": st.column_config.Column(width="small"),
+                        "Production Date": st.column_config.Column(width="medium"),
+                        "Expiry Date": st.column_config.Column(width="medium"),
+                        "Product": st.column_config.Column(width="large"),
+                        "Category": st.column_config.Column(width="medium"),
+                        "Quantity": st.column_config.Column(width="medium")
+                    }
+                )
+            st.write(f"Found {totals.count} production records")
+            st.write(f"Total Production: {totals.quantity:,.2f}")
         else:
             st.info("No production records found matching your criteria")
     except Exception as e:
@@ -1,30 +1,39 @@
 import streamlit as st
 from sqlalchemy import text
 import pandas as pd
+from app.database.aggregates import refresh_product_aggregates
+from app.database.product_search import DEFAULT_LIMIT, find_products
+from app.utils.helpers import cached_fetchall, invalidate
+
+# Delete guard: whether the product has orders or batches, and how many the
+# maintained usage counters count
+PRODUCT_USAGE_QUERY = text("""
+    SELECT
+        EXISTS (SELECT 1 FROM sales WHERE product_id = :id) as has_sales,
+        EXISTS (SELECT 1 FROM inventory WHERE product_id = :id) as has_inventory,
+        COALESCE(
+            (SELECT sales_count FROM product_usage WHERE product_id = :id), 0
+        ) as sales_count,
+        COALESCE(
+            (SELECT production_count FROM product_usage WHERE product_id = :id), 0
+        ) as inventory_count
+""")
+
+def best_matches(db, search_term):
+    """Get the best DEFAULT_LIMIT matches of a search, telling the user when
+    more products match"""
+    products = find_products(db, search_term, limit=DEFAULT_LIMIT + 1)
+    if len(products) > DEFAULT_LIMIT:
+        st.caption(f"Showing the best {DEFAULT_LIMIT} matches; refine the search to see the others")
+    return products[:DEFAULT_LIMIT]
 
 def show_products(db, search_term=None):
     """Display products, optionally filtered by search term"""
     try:
         if search_term:
-            query = text("""
-                SELECT p.id, p.name, p.description, c.name as category_name, p.base_price
-                FROM products p
-                JOIN categories c ON p.category = c.name
-                WHERE p.description ILIKE :search 
-                OR CAST(p.id AS TEXT) LIKE :search
-                OR p.name ILIKE :search
-                OR c.name ILIKE :search
-                ORDER BY p.id
-            """)
-            products = db.execute(query, {"search": f"%{search_term}%"}).fetchall()
+            products = best_matches(db, search_term)
         else:
-            query = text("""
-                SELECT p.id, p.name, p.description, c.name as category_name, p.base_price
-                FROM products p
-                JOIN categories c ON p.category = c.name
-                ORDER BY p.id
-            """)
-            products = db.execute(query).fetchall()
+            products = find_products(db, limit=None)
         
         if products:
             st.write("### Product List")
@@ -46,9 +55,9 @@ def show_products(db, search_term=None):
 def get_categories(db):
     """Get list of product categories"""
     try:
-        categories = db.execute(text("""
+        categories = cached_fetchall(db, text("""
             SELECT name FROM categories ORDER BY name
-        """)).fetchall()
+        """), tables=("categories",))
         return [c.name for c in categories]
     except Exception as e:
         st.error(f"Error loading categories: {str(e)}")
@@ -104,6 +113,7 @@ def new_product_form(db):
 
                     })
                     db.commit()
+                    invalidate("products")
                     st.success("Product added successfully!")
                     st.rerun()
             except Exception as e:
@@ -122,17 +132,7 @@ def edit_delete_product(db):
     
 
     if search:
-        products = db.execute(text("""
-            SELECT p.id, p.name, p.description, c.name as category_name, 
-                p.base_price, p.days_to_expiration
-            FROM products p
-            JOIN categories c ON p.category = c.name
-            WHERE p.description ILIKE :search 
-            OR CAST(p.id AS TEXT) LIKE :search
-            OR p.name ILIKE :search
-            OR c.name ILIKE :search
-            ORDER BY p.id
-        """), {"search": f"%{search}%"}).fetchall()
+        products = best_matches(db, search)
         
         if products:
             product_options = {
@@ -201,7 +201,9 @@ def edit_delete_product(db):
                                 "days_to_expiration": new_days_to_expiration,
                                 "id": product.id
                             })
+                            refresh_product_aggregates(db, product.id)
                             db.commit()
+                            invalidate("products")
                             st.success("Product updated successfully!")
                             st.rerun()
                         except Exception as e:
@@ -209,27 +211,24 @@ def edit_delete_product(db):
                             st.error(f"Error updating product: {str(e)}")
                 
                 with col4:
-                    # Check if product has any sales or inventory before allowing deletion
-                    usage = db.execute(text("""
-                        SELECT 
-                            (SELECT COUNT(*) FROM sales WHERE product_id = :id) as sales_count,
-                            (SELECT COUNT(*) FROM inventory WHERE product_id = :id) as inventory_count
-                    """), {"id": product.id}).fetchone()
+                    # Check if product has any sales or inventory before allowing deletion;
+                    # the counts shown come from the maintained usage counters
+                    usage = db.execute(PRODUCT_USAGE_QUERY, {"id": product.id}).fetchone()
                     
                     delete_confirmed = st.checkbox(
                         "I confirm I want to delete this product",
                         key="delete_product_confirm"
                     )
                     
-                    total_usage = usage.sales_count + usage.inventory_count
+                    in_use = usage.has_sales or usage.has_inventory
                     delete_button = st.button(
                         "Delete Product",
                         key="delete_product",
                         type="secondary",
-                        disabled=total_usage > 0
+                        disabled=in_use
                     )
                     
-                    if total_usage > 0:
+                    if in_use:
                         st.warning(
                             f"This product cannot be deleted because it has "
                             f"{usage.sales_count} sales records and "
@@ -243,6 +242,7 @@ def edit_delete_product(db):
                                 {"id": product.id}
                             )
                             db.commit()
+                            invalidate("products")
                             st.success("Product deleted successfully!")
                             st.rerun()
                         except Exception as e:
@@ -261,7 +261,9 @@ def search_products(db):
         search_term = st.text_input("Search by Product ID, Product Name, or Description")
     
     with col2:
-        categories = db.execute(text("SELECT name FROM categories ORDER BY name")).fetchall()
+        categories = cached_fetchall(
+            db, text("SELECT name FROM categories ORDER BY name"), tables=("categories",)
+        )
         category_options = [c.name for c in categories]
         category_options.insert(0, "All Categories")
         selected_category = st.selectbox(
@@ -270,52 +272,34 @@ def search_products(db):
             key="product_search_category"
         )
     
-    query = """
-        SELECT 
-            p.id,
-            p.name,
-            p.description,
-            c.name as category,
-            p.base_price,
-            (SELECT COUNT(*) FROM sales s WHERE s.product_id = p.id) as total_sales,
-            (SELECT COUNT(*) FROM inventory i WHERE i.product_id = p.id) as total_production
-        FROM products p
-        JOIN categories c ON p.category = c.name
-        WHERE 1=1
-    """
-    params = {}
-    
-    if search_term:
-        query += """ 
-            AND (
-                CAST(p.id AS TEXT) ILIKE :search 
-                OR p.name ILIKE :search
-                OR p.description ILIKE :search
-            )
-        """
-        params["search"] = f"%{search_term}%"
-    
-    if selected_category != "All Categories":
-        query += " AND c.name = :category"
-        params["category"] = selected_category
-    
-    query += " ORDER BY p.id"
-    
     try:
-        results = db.execute(text(query), params).fetchall()
-        if results:
+        products = find_products(
+            db,
+            search_term,
+            category=None if selected_category == "All Categories" else selected_category,
+            limit=None
+        )
+        product_ids = [p.id for p in products]
+        
+        # Maintained usage counters of the matched products, one row each
+        usage = {row.product_id: row for row in cached_fetchall(db, text("""
+            SELECT product_id, sales_count, production_count FROM product_usage
+            WHERE product_id = ANY(:ids)
+        """), {"ids": product_ids}, tables=("sales", "inventory"))}
+        
+        if products:
             df = pd.DataFrame([{
-                "ID": str(r.id),
-                "Name": r.name,
-                "Description": r.description,
-                "Category": r.category,
-                "Base Price": f"${r.base_price:.2f}",
-                "Total Sales": r.total_sales,
-                "Total Production": r.total_production
-            } for r in results])
+                "ID": str(p.id),
+                "Name": p.name,
+                "Description": p.description,
+                "Category": p.category_name,
+                "Base Price": f"${p.base_price:.2f}",
+                "Total Sales": usage[p.id].sales_count if p.id in usage else 0,
+                "Total Production": usage[p.id].production_count if p.id in usage else 0
+            } for p in products])
             
             st.dataframe(df, hide_index=True)
-            st.write(f"Found {len(results)} products")
+            st.write(f"Found {len(products)} products")
         else:
             st.info("No products found matching your criteria")
     except Exception as e:
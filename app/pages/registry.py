@@ -0,0 +1,90 @@
+"""Page registry that imports each page module when it is first opened
+
+app.py lists the pages by name and icon only. A page module, with its
+own dependencies such as numpy, is imported the first time the page is
+selected, so a cold start pays for the page being opened and not for all
+of them. Later reruns find the module already loaded. Pages that draw
+charts also import plotly inside show(), at first render.
+
+Usage:
+    python -m app.pages.registry --benchmark   # import cost per page, fresh interpreters
+"""
+import argparse
+import importlib
+import subprocess
+import sys
+
+# Navigation label -> (icon, module in app.pages)
+PAGES = {
+    "Overview": ("📊", "overview"),
+    "Reports": ("📈", "reports"),
+    "Production": ("🏭", "production"),
+    "Orders": ("💰", "sales"),
+    "Products": ("📦", "products"),
+    "Customers": ("👥", "customers"),
+}
+
+def page_icon(name):
+    """Get the navigation icon of a page"""
+    return PAGES[name][0]
+
+def load_page(name):
+    """Import the module of a page on first use and return it"""
+    return importlib.import_module(f"app.pages.{PAGES[name][1]}")
+
+def _import_seconds(statement, setup=""):
+    """Time a statement in a fresh interpreter, as a cold start would run it"""
+    script = (
+        f"{setup}\n"
+        "import time\n"
+        "started = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - started)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+def benchmark(rounds=5):
+    """Best cold import time in seconds of every page, of all pages eagerly
+    and of a page's first render dependencies (plotly)
+
+    Each measurement runs in a fresh interpreter, so nothing is cached in
+    sys.modules between rounds (the OS file cache still is). The best of
+    several rounds is reported, as the others only add scheduling noise.
+    """
+    base = "import app.database.connection"
+    statements = {"App shell": (base, "")}
+    for name, (_, module) in PAGES.items():
+        statements[f"{name} page"] = (f"{base}; import app.pages.{module}", "")
+    every_page = "; ".join(f"import app.pages.{module}" for _, module in PAGES.values())
+    statements["All pages (eager)"] = (f"{base}; {every_page}", "")
+    # Pages load pandas anyway, so only count what plotly adds on top of it
+    statements["plotly (first chart)"] = ("import plotly.express, plotly.graph_objects",
+                                          "import pandas")
+
+    return {
+        label: min(_import_seconds(statement, setup) for _ in range(rounds))
+        for label, (statement, setup) in statements.items()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streamlit page registry")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="measure the cold import time of each page")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="fresh interpreters per measurement (default 5)")
+    args = parser.parse_args(argv)
+
+    if not args.benchmark:
+        for name, (icon, module) in PAGES.items():
+            print(f"{icon} {name}\tapp.pages.{module}")
+        return 0
+
+    for label, seconds in benchmark(args.rounds).items():
+        print(f"{label:<22} {seconds * 1000:8.1f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,36 @@
 import streamlit as st
 from sqlalchemy import text
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
 import pandas as pd
+from app.utils.helpers import cached_fetchall, cached_fetchone
+
+DAILY_DATA_QUERY = text("""
+    SELECT 
+        sale_day as sale_date,
+        COALESCE(SUM(revenue), 0) as revenue,
+        COALESCE(SUM(cogs), 0) as cogs
+    FROM sales_daily_agg
+    WHERE sale_day BETWEEN :start_date AND :end_date
+    GROUP BY sale_day
+    ORDER BY sale_day
+""")
 
 def get_summary_metrics(db, start_date, end_date):
     """Get summary metrics for the period"""
     try:
         query = text("""
             SELECT 
-                COUNT(*) as total_sales,
-                COALESCE(SUM(s.quantity * s.price_per_unit), 0) as total_revenue,
-                COALESCE(SUM(s.quantity * p.base_price), 0) as total_cogs
-            FROM sales s
-            JOIN products p ON s.product_id = p.id
-            WHERE s.sale_date BETWEEN :start_date AND :end_date
+                COALESCE(SUM(order_lines), 0) as total_sales,
+                COALESCE(SUM(revenue), 0) as total_revenue,
+                COALESCE(SUM(cogs), 0) as total_cogs
+            FROM sales_daily_agg
+            WHERE sale_day BETWEEN :start_date AND :end_date
         """)
         
-        result = db.execute(query, {
+        result = cached_fetchone(db, query, {
             "start_date": start_date,
             "end_date": end_date
-        }).fetchone()
+        }, tables=("sales", "products"))
         
         db.commit()
         
@@ -48,22 +57,10 @@ def get_summary_metrics(db, start_date, end_date):
 def get_daily_data(db, start_date, end_date):
     """Get daily revenue and COGS data"""
     try:
-        query = text("""
-            SELECT 
-                s.sale_date,
-                COALESCE(SUM(s.quantity * s.price_per_unit), 0) as revenue,
-                COALESCE(SUM(s.quantity * p.base_price), 0) as cogs
-            FROM sales s
-            JOIN products p ON s.product_id = p.id
-            WHERE s.sale_date BETWEEN :start_date AND :end_date
-            GROUP BY s.sale_date
-            ORDER BY s.sale_date;
-        """)
-        
-        results = db.execute(query, {
+        results = cached_fetchall(db, DAILY_DATA_QUERY, {
             "start_date": start_date,
             "end_date": end_date
-        }).fetchall()
+        }, tables=("sales", "products"))
         
         dates = [r.sale_date.strftime('%Y-%m-%d') for r in results]
         revenues = [float(r.revenue) for r in results]
@@ -80,21 +77,19 @@ def get_sales_by_group(db, start_date, end_date):
     try:
         query = text("""
             SELECT 
-                s.sale_date,
-                c.name as category_name,
-                COALESCE(SUM(s.quantity * s.price_per_unit), 0) as revenue
-            FROM sales s
-            JOIN products p ON s.product_id = p.id
-            JOIN categories c ON p.category = c.name
-            WHERE s.sale_date BETWEEN :start_date AND :end_date
-            GROUP BY s.sale_date, c.name
-            ORDER BY s.sale_date, c.name;
+                sale_day as sale_date,
+                category as category_name,
+                COALESCE(SUM(revenue), 0) as revenue
+            FROM sales_daily_agg
+            WHERE sale_day BETWEEN :start_date AND :end_date
+            GROUP BY sale_day, category
+            ORDER BY sale_day, category;
         """)
         
-        results = db.execute(query, {
+        results = cached_fetchall(db, query, {
             "start_date": start_date,
             "end_date": end_date
-        }).fetchall()
+        }, tables=("sales", "products"))
         
         data = {
             'date': [r.sale_date.strftime('%Y-%m-%d') for r in results],
@@ -110,6 +105,10 @@ def get_sales_by_group(db, start_date, end_date):
 
 def show():
     """Main reports page"""
+    # Imported on first render, so loading the module does not pay for plotly
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     st.title("Projected Sales Overview")
     
     # Get first and last day of current month
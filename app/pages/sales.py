@@ -2,6 +2,13 @@ import streamlit as st
 from datetime import datetime
 from sqlalchemy import text
 import pandas as pd
+from app.database.aggregates import add_sales_to_aggregates, remove_sales_from_aggregates
+from app.database.batches import allocate_sales, release_sales
+from app.database.models import sales_frame, sales_totals
+from app.database.orders import record_order
+from app.utils.catalog import get_catalog
+from app.utils.helpers import cached_fetchall, invalidate
+from app.utils.pagination import keyset_browser
 
 def initialize_sale_state():
     """Initialize session state variables for multi-product sales"""
@@ -31,47 +38,32 @@ def clear_current_sale():
     st.session_state.current_sale_items = []
     st.session_state.sale_customer_id = None
 
-def show_recent_sales(db, customer_id=None):
-    """Display recent sales, optionally filtered by customer"""
+def show_recent_sales(db, customer_id=None, key="recent_sales"):
+    """Display recent sales a page at a time, optionally filtered by customer"""
     try:
-        if customer_id:
-            query = text("""
-                SELECT s.id, s.sale_date, c.name as customer, p.name as product,
-                       cat.name as category, s.quantity, s.unit, s.price_per_unit
-                FROM sales s
-                JOIN customers c ON s.customer_id = c.id
-                JOIN products p ON s.product_id = p.id
-                JOIN categories cat ON p.category = cat.name
-                WHERE s.customer_id = :customer_id
-                ORDER BY s.sale_date DESC, s.id DESC
-                LIMIT 10
-            """)
-            sales = db.execute(query, {"customer_id": customer_id}).fetchall()
-        else:
-            query = text("""
-                SELECT s.id, s.sale_date, c.name as customer, p.name as product,
-                       cat.name as category, s.quantity, s.unit, s.price_per_unit
-                FROM sales s
-                JOIN customers c ON s.customer_id = c.id
-                JOIN products p ON s.product_id = p.id
-                JOIN categories cat ON p.category = cat.name
-                ORDER BY s.sale_date DESC, s.id DESC
-                LIMIT 10
-            """)
-            sales = db.execute(query).fetchall()
+        customer_id = customer_id or None
+        st.write("### Recent Orders")
+        sales = keyset_browser(
+            db, key,
+            lambda db, after, limit: sales_frame(
+                db, None, None, customer_id=customer_id, limit=limit, after=after
+            ),
+            cursor_columns=("sale_date", "id"),
+            total_rows=None,
+            filters=(customer_id,)
+        )
         
-        if sales:
-            st.write("### Recent Orders")
-            st.dataframe({
-                "ID": [s.id for s in sales],
-                "Date": [s.sale_date.strftime("%Y-%m-%d") for s in sales],
-                "Customer": [s.customer for s in sales],
-                "Product": [s.product for s in sales],
-                "Category": [s.category for s in sales],
-                "Quantity": [f"{s.quantity} {s.unit}" for s in sales],
-                "Price/Unit": [f"${s.price_per_unit:.2f}" for s in sales],
-                "Total": [f"${s.quantity * s.price_per_unit:.2f}" for s in sales],
-            })
+        if not sales.empty:
+            st.dataframe(pd.DataFrame({
+                "ID": sales["id"],
+                "Date": sales["sale_date"].dt.strftime("%Y-%m-%d"),
+                "Customer": sales["customer"],
+                "Product": sales["product"],
+                "Category": sales["category"],
+                "Quantity": sales["quantity"].astype(str) + " " + sales["unit"],
+                "Price/Unit": sales["price_per_unit"].map("${:.2f}".format),
+                "Total": sales["total"].map("${:.2f}".format)
+            }), hide_index=True)
         else:
             st.info("No recent orders found")
     except Exception as e:
@@ -85,7 +77,9 @@ def new_sale_form(db):
     initialize_sale_state()
     
     # Customer selection
-    customers = db.execute(text("SELECT id, name FROM customers ORDER BY name")).fetchall()
+    customers = cached_fetchall(
+        db, text("SELECT id, name FROM customers ORDER BY name"), tables=("customers",)
+    )
     customer_options = {c.name: c.id for c in customers}
     
     # Only show customer selection if no items added yet
@@ -108,16 +102,7 @@ def new_sale_form(db):
     st.write("### Add Product to Order")
     search_term = st.text_input("Search Product (ID, name, or category)", key="product_search")
     if search_term:
-        products = db.execute(text("""
-            SELECT p.id, p.name, p.description, c.name as category_name
-            FROM products p 
-            JOIN categories c ON p.category = c.name
-            WHERE p.description ILIKE :search 
-            OR CAST(p.id AS TEXT) LIKE :search
-            OR c.name ILIKE :search
-            OR p.name ILIKE :search
-            ORDER BY p.description
-        """), {"search": f"%{search_term}%"}).fetchall()
+        products = get_catalog(db).search(search_term)
 
         if products:
             product_options = [
@@ -227,21 +212,15 @@ def new_sale_form(db):
         with col1:
             if st.button("Submit Complete Order", key="submit_sale_button", type="primary"):
                 try:
-                    # Insert each sale item
-                    for item in st.session_state.current_sale_items:
-                        db.execute(text("""
-                            INSERT INTO sales 
-                            (product_id, customer_id, quantity, unit, price_per_unit, sale_date)
-                            VALUES (:product_id, :customer_id, :quantity, :unit, :price, :sale_date)
-                        """), {
-                            "product_id": item['product_id'],
-                            "customer_id": st.session_state.sale_customer_id,
-                            "quantity": item['quantity'],
-                            "unit": item['unit'],
-                            "price": item['price'],
-                            "sale_date": st.session_state.sale_date
-                        })
+                    # Insert all sale items in one statement
+                    record_order(db, st.session_state.sale_customer_id, st.session_state.sale_date, [{
+                        "product_id": item['product_id'],
+                        "quantity": item['quantity'],
+                        "unit": item['unit'],
+                        "price_per_unit": item['price']
+                    } for item in st.session_state.current_sale_items])
                     db.commit()
+                    invalidate("sales")
                     st.success("Complete order recorded successfully!")
                     clear_current_sale()
                     st.rerun()
@@ -256,14 +235,16 @@ def new_sale_form(db):
 
     # Show recent sales at the bottom
     st.markdown("---")
-    show_recent_sales(db, st.session_state.sale_customer_id)
+    show_recent_sales(db, st.session_state.sale_customer_id, key="new_sale_recent")
 
 def edit_delete_sale(db):
     """Interface for editing or deleting sales"""
     st.subheader("Edit or Delete Order")
     
     # Customer selection for filtering
-    customers = db.execute(text("SELECT id, name FROM customers ORDER BY name")).fetchall()
+    customers = cached_fetchall(
+        db, text("SELECT id, name FROM customers ORDER BY name"), tables=("customers",)
+    )
     customer_options = {c.name: c.id for c in customers}
     selected_customer_name = st.selectbox(
         "Select Customer",
@@ -305,6 +286,8 @@ def edit_delete_sale(db):
                 with col3:
                     if st.button("Update Order", key="update_sale_button"):
                         try:
+                            release_sales(db, [sale.id])
+                            remove_sales_from_aggregates(db, [sale.id])
                             db.execute(text("""
                                 UPDATE sales
                                 SET quantity = :quantity, unit = :unit, price_per_unit = :price
@@ -315,7 +298,10 @@ def edit_delete_sale(db):
                                 "price": new_price,
                                 "sale_id": sale_id
                             })
+                            add_sales_to_aggregates(db, [sale.id])
+                            allocate_sales(db, [sale.id])
                             db.commit()
+                            invalidate("sales")
                             st.success("Order updated successfully!")
                             st.rerun()
                         except Exception as e:
@@ -329,9 +315,12 @@ def edit_delete_sale(db):
                                                     type="secondary",
                                                     key="delete_sale_button"):
                         try:
+                            release_sales(db, [sale.id])
+                            remove_sales_from_aggregates(db, [sale.id])
                             db.execute(text("DELETE FROM sales WHERE id = :sale_id"), 
                                      {"sale_id": sale_id})
                             db.commit()
+                            invalidate("sales")
                             st.success("Order deleted successfully!")
                             st.rerun()
                         except Exception as e:
@@ -344,7 +333,7 @@ def edit_delete_sale(db):
     
     # Show recent sales at the bottom
     st.markdown("---")
-    show_recent_sales(db, selected_customer_id)
+    show_recent_sales(db, selected_customer_id, key="edit_sale_recent")
 
 def search_sales(db):
     """Interface for searching sales records"""
@@ -360,7 +349,9 @@ def search_sales(db):
     
     with col2:
         # Customer filter
-        customers = db.execute(text("SELECT id, name FROM customers ORDER BY name")).fetchall()
+        customers = cached_fetchall(
+            db, text("SELECT id, name FROM customers ORDER BY name"), tables=("customers",)
+        )
         customer_options = {"All Customers": None}  # Put "All" first
         customer_options.update({c.name: c.id for c in customers})  # Add other customers
         selected_customer = st.selectbox(
@@ -371,7 +362,9 @@ def search_sales(db):
     
     with col3:
         # Product category filter
-        categories = db.execute(text("SELECT name FROM categories ORDER BY name")).fetchall()
+        categories = cached_fetchall(
+            db, text("SELECT name FROM categories ORDER BY name"), tables=("categories",)
+        )
         category_options = [c.name for c in categories]
         category_options.insert(0, "All Categories")
         selected_category = st.selectbox(
@@ -380,59 +373,46 @@ def search_sales(db):
             key="search_category"
         )
     
-    # Build query based on filters
-    query = """
-        SELECT 
-            s.id,
-            s.sale_date,
-            c.name as customer,
-            p.name as product,
-            cat.name as category,
-            s.quantity,
-            s.unit,
-            s.price_per_unit,
-            (s.quantity * s.price_per_unit) as total
-        FROM sales s
-        JOIN customers c ON s.customer_id = c.id
-        JOIN products p ON s.product_id = p.id
-        JOIN categories cat ON p.category = cat.name
-        WHERE s.sale_date BETWEEN :start_date AND :end_date
-    """
-    params = {"start_date": start_date, "end_date": end_date}
-    
-    if selected_customer != "All Customers":
-        query += " AND s.customer_id = :customer_id"
-        params["customer_id"] = customer_options[selected_customer]
-    
-    if selected_category != "All Categories":
-        query += " AND cat.name = :category"
-        params["category"] = selected_category
-    
-    query += " ORDER BY s.sale_date DESC"
-    
-    # Execute search
+    # Execute search: totals in SQL, then browse the rows a page at a time
     try:
-        results = db.execute(text(query), params).fetchall()
-        if results:
-            # Convert to DataFrame for better display
-            df = pd.DataFrame([{
-                "ID": r.id,
-                "Date": r.sale_date.strftime("%Y-%m-%d"),
-                "Customer": r.customer,
-                "Product": r.product,
-                "Category": r.category,
-                "Quantity": f"{r.quantity} {r.unit}",
-                "Price/Unit": f"${r.price_per_unit:.2f}",
-                "Total": f"${r.total:.2f}"
-            } for r in results])
+        filters = {
+            "customer_id": customer_options[selected_customer],
+            "category": None if selected_category == "All Categories" else selected_category
+        }
+        totals = sales_totals(db, start_date, end_date, **filters)
+        if totals.count:
+            results = keyset_browser(
+                db, "search_sales",
+                lambda db, after, limit: sales_frame(
+                    db, start_date, end_date, limit=limit, after=after, **filters
+                ),
+                cursor_columns=("sale_date", "id"),
+                total_rows=totals.count,
+                filters=(start_date, end_date, *filters.values())
+            )
             
-            # Show results
-            st.dataframe(df, hide_index=True)
+            if results.empty:
+                # Rows deleted since the page before was shown
+                st.info("No more order records; go back to the previous page")
+            else:
+                # Format for display
+                df = pd.DataFrame({
+                    "ID": results["id"],
+                    "Date": results["sale_date"].dt.strftime("%Y-%m-%d"),
+                    "Customer": results["customer"],
+                    "Product": results["product"],
+                    "Category": results["category"],
+                    "Quantity": results["quantity"].astype(str) + " " + results["unit"],
+                    "Price/Unit": results["price_per_unit"].map("${:.2f}".format),
+                    "Total": results["total"].map("${:.2f}".format)
+                })
+                
+                # Show results
+                st.dataframe(df, hide_index=True)
             
             # Show summary
-            st.write(f"Found {len(results)} order records")
-            total_revenue = sum(r.total for r in results)
-            st.write(f"Total Revenue: ${total_revenue:,.2f}")
+            st.write(f"Found {totals.count} order records")
+            st.write(f"Total Revenue: ${totals.revenue:,.2f}")
             
         else:
             st.info("No order records found matching your criteria")
@@ -0,0 +1,401 @@
+"""JSON API for machine clients such as ERP and EDI integrations
+
+Runs as a tornado process next to the Streamlit app, so integrations do
+not pay for a full Streamlit script rerun per request:
+
+    python -m app.routes.api [--port 8502]
+
+Endpoints:
+    GET  /api/stock        current stock per product
+    GET  /api/projection   weekly stock projection per product (?weeks=26)
+    GET  /api/expiry       FIFO expiry buckets per week (?weeks=15)
+    GET  /api/orders       order lines, newest first (?customer_id=, ?product_id=)
+    POST /api/orders       record an order
+    GET  /api/health       database reachability and connection pool statistics
+
+Every request needs an API key (see app/routes/auth.py), sent as
+"Authorization: Bearer <token>".
+
+List endpoints use keyset pagination: pass the next_cursor of a response
+as ?cursor= to get the next page (?limit= sets the page size); the cursor
+and limit go into the query. Handlers call the same query functions as
+the pages and run them on a worker thread with a pooled session, so the
+IOLoop never blocks on the database. Database errors are answered with a
+500 rather than an empty result. Responses are gzip-compressed for clients
+that accept it.
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import logging
+import math
+import os
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+import tornado.web
+
+from app.database.batches import expiry_buckets
+from app.database.connection import configure_engine, db_session, get_pool_stats
+from app.database.invalidation import start_cache_listener
+from app.database.orders import record_order
+from app.database.stock import get_stock_levels
+from app.pages.overview import create_stock_matrix
+from app.routes.auth import AUTH_FAILURE_WINDOW, authenticate, cached_key_id, is_throttled
+from app.utils.buckets import bucket_labels, bucket_starts, horizon_end
+from app.utils.helpers import cached_fetchall, invalidate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = int(os.getenv('API_PORT', '8502'))
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+PROJECTION_WEEKS = 26
+EXPIRY_WEEKS = 15
+MAX_WEEKS = 104
+# Length of the unit columns of inventory and sales
+MAX_UNIT_LENGTH = 20
+
+# Database worker threads, created by serve() with one per pooled
+# connection so that requests queue here rather than inside the pool
+_executor = None
+
+def _json_default(value):
+    """Serialize the database and numpy types that json does not know"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _with_session(func, *args):
+    with db_session() as db:
+        return func(db, *args)
+
+class BaseHandler(tornado.web.RequestHandler):
+    """JSON responses, errors and argument parsing shared by all endpoints"""
+
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+
+    async def prepare(self):
+        """Reject requests without a valid API key"""
+        scheme, _, token = self.request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            self._unauthorized()
+        # Recently verified tokens are answered from memory on the IOLoop
+        self.key_id = cached_key_id(token)
+        client = self.request.remote_ip
+        if self.key_id is None and is_throttled(token, client):
+            self._reject(429, "Too many failed authentication attempts",
+                         {"Retry-After": str(AUTH_FAILURE_WINDOW)})
+        if self.key_id is None:
+            self.key_id = await self.run_db(authenticate, token, client)
+        if self.key_id is None:
+            self._unauthorized()
+
+    def _unauthorized(self):
+        self._reject(401, "Invalid or missing API key", {"WWW-Authenticate": "Bearer"})
+
+    def _reject(self, status, reason, headers):
+        """End the request with an error and headers (send_error would drop them)"""
+        self.set_status(status, reason=reason)
+        for name, value in headers.items():
+            self.set_header(name, value)
+        raise tornado.web.Finish(json.dumps({"error": reason}))
+
+    async def run_db(self, func, *args):
+        """Run func(db, *args) on a worker thread with a pooled session"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _with_session, func, *args)
+
+    def write_json(self, data, status=200):
+        self.set_status(status)
+        self.finish(json.dumps(data, default=_json_default))
+
+    def write_error(self, status_code, **kwargs):
+        self.finish(json.dumps({"error": self._reason}))
+
+    def get_int_argument(self, name, default=None, minimum=None, maximum=None):
+        """Get an integer query argument, rejecting malformed values with a 400"""
+        value = self.get_query_argument(name, None)
+        if value is None or value == "":
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason=f"{name} must be an integer")
+        if minimum is not None and value < minimum:
+            raise tornado.web.HTTPError(400, reason=f"{name} must be at least {minimum}")
+        if maximum is not None and value > maximum:
+            raise tornado.web.HTTPError(400, reason=f"{name} must be at most {maximum}")
+        return value
+
+    def get_limit(self):
+        return self.get_int_argument("limit", DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+
+def _product_page(stock_data, limit):
+    """Split the limit + 1 products fetched after the cursor into the page
+    and the next cursor"""
+    page = list(stock_data)[:limit]
+    return page, (str(page[-1]) if len(stock_data) > limit else None)
+
+class StockHandler(BaseHandler):
+    async def get(self):
+        cursor = self.get_int_argument("cursor")
+        limit = self.get_limit()
+        today = datetime.now().date()
+        stock_data = await self.run_db(get_stock_levels, today, today, cursor, limit + 1)
+
+        page, next_cursor = _product_page(stock_data, limit)
+        self.write_json({
+            "as_of": today,
+            "items": [{
+                "product_id": stock_data[product_id]['id'],
+                "name": stock_data[product_id]['name'],
+                "category": stock_data[product_id]['category'],
+                "current_stock": stock_data[product_id]['current_stock'],
+                "unit": stock_data[product_id]['unit']
+            } for product_id in page],
+            "next_cursor": next_cursor
+        })
+
+class ProjectionHandler(BaseHandler):
+    async def get(self):
+        cursor = self.get_int_argument("cursor")
+        limit = self.get_limit()
+        num_weeks = self.get_int_argument("weeks", PROJECTION_WEEKS, minimum=1, maximum=MAX_WEEKS)
+        today = datetime.now().date()
+        # The same horizon and weeks as the Overview page's weekly projection
+        end_date = horizon_end(today, num_weeks, "week")
+        weeks = bucket_labels(today, num_weeks, "week")
+        stock_data = await self.run_db(get_stock_levels, today, end_date, cursor, limit + 1)
+
+        page, next_cursor = _product_page(stock_data, limit)
+        matrix = create_stock_matrix(
+            {product_id: stock_data[product_id] for product_id in page},
+            today, periods=num_weeks, granularity="week"
+        )
+        items = []
+        for row in matrix.to_dict('records'):
+            data = stock_data[int(row['Product ID'])]
+            items.append({
+                "product_id": data['id'],
+                "name": data['name'],
+                "category": data['category'],
+                "current_stock": row['Current Stock'],
+                "unit": data['unit'],
+                "levels": [row[week] for week in weeks]
+            })
+        self.write_json({
+            "as_of": today,
+            "weeks": weeks,
+            "week_starts": bucket_starts(today, num_weeks, "week"),
+            "items": items,
+            "next_cursor": next_cursor
+        })
+
+class ExpiryHandler(BaseHandler):
+    async def get(self):
+        num_weeks = self.get_int_argument("weeks", EXPIRY_WEEKS, minimum=1, maximum=MAX_WEEKS)
+        today = datetime.now().date()
+        weeks, quantities, details = await self.run_db(expiry_buckets, today, num_weeks, "week")
+        self.write_json({
+            "as_of": today,
+            "weeks": [{
+                "week": week,
+                "quantity": quantity,
+                "products": details[week]
+            } for week, quantity in zip(weeks, quantities)]
+        })
+
+def _order_cursor(row):
+    """Cursor after an order line: <sale_date ISO or null>,<sale id>"""
+    sale_date = "null" if row.sale_date is None else row.sale_date.isoformat()
+    return f"{sale_date},{row.id}"
+
+def _parse_order_cursor(cursor):
+    """Split an orders cursor into (sale_date or None, sale id)"""
+    try:
+        sale_date, sale_id = cursor.rsplit(",", 1)
+        sale_date = None if sale_date == "null" else datetime.fromisoformat(sale_date)
+        return sale_date, int(sale_id)
+    except ValueError:
+        raise tornado.web.HTTPError(400, reason="Invalid cursor")
+
+def _list_orders(db, cursor, limit, customer_id, product_id):
+    query = """
+        SELECT s.id, s.sale_date, s.customer_id, c.name as customer_name,
+               s.product_id, p.name as product_name, s.quantity, s.unit,
+               s.price_per_unit, s.quantity * s.price_per_unit as total, s.status
+        FROM sales s
+        LEFT JOIN customers c ON s.customer_id = c.id
+        JOIN products p ON s.product_id = p.id
+        WHERE 1=1
+    """
+    params = {"limit": limit + 1}
+
+    # Lines without a date sort first (DESC puts NULLs first, as a
+    # backward scan of the (sale_date, id) index returns them)
+    if cursor and cursor[0] is None:
+        query += " AND (s.sale_date IS NOT NULL OR s.id < :cursor_id)"
+        params["cursor_id"] = cursor[1]
+    elif cursor:
+        query += " AND (s.sale_date, s.id) < (:cursor_date, :cursor_id)"
+        params["cursor_date"], params["cursor_id"] = cursor
+
+    if customer_id is not None:
+        query += " AND s.customer_id = :customer_id"
+        params["customer_id"] = customer_id
+
+    if product_id is not None:
+        query += " AND s.product_id = :product_id"
+        params["product_id"] = product_id
+
+    query += " ORDER BY s.sale_date DESC, s.id DESC LIMIT :limit"
+    return cached_fetchall(db, text(query), params, tables=("sales", "customers", "products"))
+
+def _is_integer(value):
+    # json gives true/false as bool, which is a subclass of int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _create_order(db, customer_id, sale_date, items):
+    sale_ids = record_order(db, customer_id, sale_date, items)
+    db.commit()
+    invalidate("sales")
+    return sale_ids
+
+class OrdersHandler(BaseHandler):
+    async def get(self):
+        cursor = self.get_query_argument("cursor", None)
+        cursor = _parse_order_cursor(cursor) if cursor else None
+        limit = self.get_limit()
+        customer_id = self.get_int_argument("customer_id")
+        product_id = self.get_int_argument("product_id")
+
+        rows = await self.run_db(_list_orders, cursor, limit, customer_id, product_id)
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _order_cursor(page[-1])
+        self.write_json({
+            "items": [dict(r._mapping) for r in page],
+            "next_cursor": next_cursor
+        })
+
+    async def post(self):
+        """Record an order
+
+        Body: {"customer_id": 1, "sale_date": "2025-01-31" (optional, default
+        now), "items": [{"product_id": 2, "quantity": 10, "unit": "L",
+        "price_per_unit": 4.5}, ...]}
+        """
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Request body must be JSON")
+        if not isinstance(body, dict):
+            raise tornado.web.HTTPError(400, reason="Request body must be a JSON object")
+
+        customer_id = body.get("customer_id")
+        if not _is_integer(customer_id):
+            raise tornado.web.HTTPError(400, reason="customer_id must be an integer")
+
+        try:
+            sale_date = datetime.fromisoformat(body["sale_date"]) if body.get("sale_date") else datetime.now()
+        except (TypeError, ValueError):
+            raise tornado.web.HTTPError(400, reason="sale_date must be an ISO date")
+
+        items = body.get("items")
+        if not isinstance(items, list) or not items:
+            raise tornado.web.HTTPError(400, reason="items must be a non-empty list")
+        order_items = []
+        for item in items:
+            try:
+                order_item = {
+                    "product_id": item["product_id"],
+                    "quantity": float(item["quantity"]),
+                    "unit": item.get("unit", "L"),
+                    "price_per_unit": float(item["price_per_unit"])
+                }
+            except (AttributeError, KeyError, TypeError, ValueError):
+                raise tornado.web.HTTPError(
+                    400, reason="Each item needs product_id, quantity and price_per_unit"
+                )
+            if not _is_integer(order_item["product_id"]):
+                raise tornado.web.HTTPError(400, reason="product_id must be an integer")
+            unit = order_item["unit"]
+            if not isinstance(unit, str) or not unit or len(unit) > MAX_UNIT_LENGTH:
+                raise tornado.web.HTTPError(
+                    400, reason=f"unit must be a string of 1 to {MAX_UNIT_LENGTH} characters"
+                )
+            # float() accepts "NaN" and "Infinity", which compare false to everything
+            if not all(
+                math.isfinite(order_item[field]) and order_item[field] > 0
+                for field in ("quantity", "price_per_unit")
+            ):
+                raise tornado.web.HTTPError(
+                    400, reason="quantity and price_per_unit must be positive numbers"
+                )
+            order_items.append(order_item)
+
+        try:
+            sale_ids = await self.run_db(_create_order, customer_id, sale_date, order_items)
+        except IntegrityError:
+            raise tornado.web.HTTPError(400, reason="Unknown customer or product")
+        self.write_json({"sale_ids": sale_ids}, status=201)
+
+def _ping(db):
+    db.execute(text("SELECT 1"))
+
+class HealthHandler(BaseHandler):
+    async def get(self):
+        try:
+            await self.run_db(_ping)
+            database = "ok"
+        except Exception as e:
+            logger.warning("Health check query failed: %s", e)
+            database = "unavailable"
+        self.write_json({
+            "status": "ok" if database == "ok" else "error",
+            "database": database,
+            "pool": get_pool_stats()
+        }, status=200 if database == "ok" else 503)
+
+def make_app():
+    """Create the tornado application"""
+    return tornado.web.Application([
+        (r"/api/stock", StockHandler),
+        (r"/api/projection", ProjectionHandler),
+        (r"/api/expiry", ExpiryHandler),
+        (r"/api/orders", OrdersHandler),
+        (r"/api/health", HealthHandler),
+    ], compress_response=True)
+
+async def serve(port):
+    global _executor
+    settings = configure_engine(application_name="inventory-api")
+    _executor = ThreadPoolExecutor(max_workers=settings["pool_size"] + settings["max_overflow"])
+    # Drop cached results when the Streamlit app or another API process writes
+    start_cache_listener()
+    make_app().listen(port)
+    logger.info("API listening on port %s", port)
+    await asyncio.Event().wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inventory JSON API")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"port to listen on (default {DEFAULT_PORT})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Token authentication for the JSON API
+
+Clients send "Authorization: Bearer <token>", where a token is
+"<key id>.<secret>". Only a salted scrypt hash of the secret is stored
+in api_keys, so a database leak does not leak usable tokens.
+
+Verifying a hash is deliberately slow, so tokens that passed verification
+are kept in an in-process LRU cache with a TTL. A burst of calls with the
+same token then costs one hash check and one lookup per TTL instead of
+one per request. Revoking a key clears it from this process's cache;
+other processes notice within AUTH_CACHE_TTL seconds.
+
+Failures are remembered too, so that bad tokens cannot keep the hash
+busy. A token that failed is rejected without another check for
+AUTH_CACHE_TTL seconds. A client address with AUTH_MAX_FAILURES failed
+attempts is rejected without checking until AUTH_FAILURE_WINDOW seconds
+have passed since its last failure. Failures are counted per client, not
+per key id: key ids are sequential, so counting them per key would let
+anyone lock a real integration out by sending bad secrets for its id.
+
+Usage:
+    python -m app.routes.auth create "ERP integration"   # prints the token once
+    python -m app.routes.auth list
+    python -m app.routes.auth revoke <key id>
+    python -m app.routes.auth benchmark                  # verification latency
+"""
+import argparse
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+
+from cachetools import TTLCache
+from sqlalchemy import text
+
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', '1024'))
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', '60'))
+AUTH_MAX_FAILURES = int(os.getenv('AUTH_MAX_FAILURES', '10'))
+AUTH_FAILURE_WINDOW = int(os.getenv('AUTH_FAILURE_WINDOW', '60'))
+
+# scrypt cost parameters (about 16 MB and tens of milliseconds per check)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+_cache_lock = threading.Lock()
+_verified_tokens = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)  # token digest -> key id
+_rejected_tokens = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)  # token digest -> True
+_failures = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_FAILURE_WINDOW)    # client -> failed attempts
+
+def hash_secret(secret):
+    """Hash a key secret with a random salt for storage"""
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(secret.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+def verify_secret(secret, key_hash):
+    """Check a key secret against its stored hash"""
+    try:
+        algorithm, n, r, p, salt, expected = key_hash.split("$")
+        if algorithm != "scrypt":
+            return False
+        digest = hashlib.scrypt(
+            secret.encode(), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p)
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+def _parse_token(token):
+    """Split a token into (key id, secret), or None if it is malformed"""
+    key_id, _, secret = (token or "").partition(".")
+    if not key_id.isdigit() or not secret:
+        return None
+    return int(key_id), secret
+
+def _cache_key(token):
+    # Cache by digest so raw tokens are not kept in memory
+    return hashlib.sha256(token.encode()).digest()
+
+def cached_key_id(token):
+    """Get the key id of a recently verified token without touching the database"""
+    with _cache_lock:
+        return _verified_tokens.get(_cache_key(token))
+
+def is_throttled(token, client=None):
+    """Check whether a token recently failed, or the client (e.g. its
+    address) failed too often, so that it is rejected without verifying it"""
+    with _cache_lock:
+        if _cache_key(token) in _rejected_tokens:
+            return True
+        return client is not None and _failures.get(client, 0) >= AUTH_MAX_FAILURES
+
+def _record_failure(token, client):
+    with _cache_lock:
+        _rejected_tokens[_cache_key(token)] = True
+        if client is not None:
+            # Setting the count restarts the client's failure window
+            _failures[client] = _failures.get(client, 0) + 1
+
+def authenticate(db, token, client=None):
+    """Get the key id a token belongs to, or None if it is not valid
+
+    client identifies the sender (e.g. its address) for throttling.
+    """
+    key_id = cached_key_id(token)
+    if key_id is not None:
+        return key_id
+
+    parsed = _parse_token(token)
+    if parsed is None or is_throttled(token, client):
+        return None
+    key_id, secret = parsed
+
+    key = db.execute(text("""
+        SELECT key_hash FROM api_keys
+        WHERE id = :key_id AND revoked_at IS NULL
+    """), {"key_id": key_id}).fetchone()
+    if key is None or not verify_secret(secret, key.key_hash):
+        _record_failure(token, client)
+        return None
+
+    with _cache_lock:
+        _verified_tokens[_cache_key(token)] = key_id
+    return key_id
+
+def create_api_key(db, name):
+    """Create an API key and return its token, which is not stored anywhere"""
+    secret = secrets.token_urlsafe(32)
+    key_id = db.execute(text("""
+        INSERT INTO api_keys (name, key_hash)
+        VALUES (:name, :key_hash)
+        RETURNING id
+    """), {"name": name, "key_hash": hash_secret(secret)}).scalar()
+    return f"{key_id}.{secret}"
+
+def revoke_api_key(db, key_id):
+    """Revoke an API key; returns False if there is no active key with that id"""
+    revoked = db.execute(text("""
+        UPDATE api_keys SET revoked_at = CURRENT_TIMESTAMP
+        WHERE id = :key_id AND revoked_at IS NULL
+    """), {"key_id": key_id}).rowcount
+    with _cache_lock:
+        for cache_key, cached_id in list(_verified_tokens.items()):
+            if cached_id == key_id:
+                del _verified_tokens[cache_key]
+    return revoked > 0
+
+def clear_auth_cache():
+    """Forget every verified and rejected token and all failed attempts"""
+    with _cache_lock:
+        _verified_tokens.clear()
+        _rejected_tokens.clear()
+        _failures.clear()
+
+def benchmark(rounds=1000):
+    """Time a full secret verification against a cache hit"""
+    secret = secrets.token_urlsafe(32)
+    key_hash = hash_secret(secret)
+    started = time.perf_counter()
+    verify_secret(secret, key_hash)
+    hash_ms = (time.perf_counter() - started) * 1000
+
+    token = f"0.{secret}"
+    with _cache_lock:
+        _verified_tokens[_cache_key(token)] = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        cached_key_id(token)
+    cached_ms = (time.perf_counter() - started) * 1000 / rounds
+    with _cache_lock:
+        _verified_tokens.pop(_cache_key(token), None)
+    return hash_ms, cached_ms
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage JSON API keys")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="create a key and print its token")
+    create.add_argument("name", help="who or what the key is for")
+    commands.add_parser("list", help="list keys")
+    revoke = commands.add_parser("revoke", help="revoke a key")
+    revoke.add_argument("key_id", type=int)
+    commands.add_parser("benchmark", help="measure token verification latency")
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        hash_ms, cached_ms = benchmark()
+        print(f"Hash verification: {hash_ms:.2f} ms")
+        print(f"Cached token:      {cached_ms:.4f} ms")
+        return 0
+
+    from app.database.connection import configure_engine, db_session
+
+    configure_engine(application_name="inventory-auth", pool_size=1, max_overflow=0)
+
+    with db_session() as db:
+        if args.command == "create":
+            token = create_api_key(db, args.name)
+            db.commit()
+            print("Store this token now, it cannot be shown again:")
+            print(token)
+        elif args.command == "list":
+            keys = db.execute(text("""
+                SELECT id, name, created_at, revoked_at FROM api_keys ORDER BY id
+            """)).fetchall()
+            for key in keys:
+                status = f"revoked {key.revoked_at:%Y-%m-%d}" if key.revoked_at else "active"
+                print(f"{key.id}\t{key.name}\tcreated {key.created_at:%Y-%m-%d}\t{status}")
+        elif args.command == "revoke":
+            if not revoke_api_key(db, args.key_id):
+                print(f"No active key with id {args.key_id}")
+                return 1
+            db.commit()
+            print(f"Key {args.key_id} revoked")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
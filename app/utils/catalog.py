@@ -0,0 +1,127 @@
+"""In-process product catalog snapshot for the order and production forms
+
+The catalog is loaded once per process and kept as parallel arrays with a
+trigram index over each product's searchable text, so typeahead lookups
+run in memory instead of querying Postgres on every rerun. The snapshot
+is reloaded after products are written (see helpers.invalidate) or once
+it is older than the cache TTL.
+"""
+from array import array
+from collections import namedtuple
+import threading
+import time
+from sqlalchemy import text
+from app.utils.helpers import DEFAULT_TTL, table_version
+
+DEFAULT_LIMIT = 50
+
+CatalogProduct = namedtuple(
+    "CatalogProduct", ["id", "name", "description", "category_name", "days_to_expiration"]
+)
+
+def _trigrams(value):
+    """Get the set of 3-character substrings of a string"""
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+class ProductCatalog:
+    """Immutable snapshot of the product catalog with a trigram index"""
+
+    def __init__(self, rows):
+        self.ids = array('q', (r.id for r in rows))
+        self.names = tuple(r.name for r in rows)
+        self.descriptions = tuple(r.description or "" for r in rows)
+        self.categories = tuple(r.category_name for r in rows)
+        self.days_to_expiration = tuple(r.days_to_expiration for r in rows)
+        self._positions = {product_id: pos for pos, product_id in enumerate(self.ids)}
+
+        # Fields are joined with a newline so that a (single line) search
+        # term can only match within one field
+        self._haystacks = tuple(
+            "\n".join((str(self.ids[pos]), self.names[pos], self.descriptions[pos],
+                       self.categories[pos])).lower()
+            for pos in range(len(self.ids))
+        )
+
+        postings = {}
+        for pos, haystack in enumerate(self._haystacks):
+            for trigram in _trigrams(haystack):
+                postings.setdefault(trigram, []).append(pos)
+        self._trigram_index = {t: array('i', p) for t, p in postings.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _product(self, pos):
+        return CatalogProduct(
+            self.ids[pos], self.names[pos], self.descriptions[pos],
+            self.categories[pos], self.days_to_expiration[pos]
+        )
+
+    def get(self, product_id):
+        """Get a product by ID, or None"""
+        pos = self._positions.get(product_id)
+        return None if pos is None else self._product(pos)
+
+    def search(self, search_term, limit=DEFAULT_LIMIT):
+        """Find products whose ID, name, description or category contain the term
+
+        Exact ID matches rank first, then names starting with the term,
+        then the rest by description.
+        """
+        term = search_term.strip().lower()
+        if not term:
+            return []
+
+        if len(term) >= 3:
+            # Intersect the posting lists, rarest trigram first
+            postings = []
+            for trigram in _trigrams(term):
+                positions = self._trigram_index.get(trigram)
+                if positions is None:
+                    return []
+                postings.append(positions)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for positions in postings[1:]:
+                candidates.intersection_update(positions)
+                if not candidates:
+                    return []
+        else:
+            candidates = range(len(self.ids))
+
+        matches = [pos for pos in candidates if term in self._haystacks[pos]]
+        matches.sort(key=lambda pos: (
+            str(self.ids[pos]) != term,
+            not self.names[pos].lower().startswith(term),
+            self.descriptions[pos],
+            self.ids[pos]
+        ))
+        return [self._product(pos) for pos in matches[:limit]]
+
+_lock = threading.Lock()
+_snapshot = None  # (versions, loaded_at, catalog)
+
+def _load_catalog(db):
+    rows = db.execute(text("""
+        SELECT p.id, p.name, p.description, c.name as category_name, p.days_to_expiration
+        FROM products p
+        JOIN categories c ON p.category = c.name
+        ORDER BY p.description
+    """)).fetchall()
+    return ProductCatalog(rows)
+
+def get_catalog(db):
+    """Get the process-wide catalog snapshot, reloading it when stale"""
+    global _snapshot
+    versions = (table_version("products"), table_version("categories"))
+    snapshot = _snapshot
+    if snapshot and snapshot[0] == versions and time.monotonic() - snapshot[1] < DEFAULT_TTL:
+        return snapshot[2]
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot and snapshot[0] == versions and time.monotonic() - snapshot[1] < DEFAULT_TTL:
+            return snapshot[2]
+        catalog = _load_catalog(db)
+        _snapshot = (versions, time.monotonic(), catalog)
+        return catalog
@@ -0,0 +1,56 @@
+"""FIFO allocation of sales to production batches
+
+Sales consume the open batch that expires first. A batch is open for a
+sale if it was produced on or before the sale date and has not expired
+before it. Sales that no open batch can cover are left unallocated.
+"""
+import heapq
+
+def allocate_fifo(batches, sales):
+    """Allocate sales to batches in one sorted pass
+
+    batches is an iterable of (batch_id, production_date, expiry_date,
+    quantity) and sales of (sale_date, quantity), both for one product.
+    Returns a dict of batch_id -> remaining quantity.
+    """
+    remaining, _ = allocate_fifo_lines(
+        batches, [(None, sale_date, quantity) for sale_date, quantity in sales]
+    )
+    return remaining
+
+def allocate_fifo_lines(batches, sales):
+    """Allocate sales to batches like allocate_fifo, keeping track of which
+    sale took what from which batch
+
+    sales is an iterable of (sale_id, sale_date, quantity). Sales on the
+    same date are served in sale_id order. Returns (remaining, allocations)
+    where allocations is a list of (sale_id, batch_id, quantity).
+    """
+    batches = sorted(batches, key=lambda b: (b[1], b[2], b[0]))
+    remaining = {batch_id: quantity for batch_id, _, _, quantity in batches}
+    allocations = []
+
+    open_batches = []  # heap of (expiry_date, production_date, batch_id)
+    next_batch = 0
+    for sale_id, sale_date, quantity in sorted(sales, key=lambda s: (s[1], s[0] or 0)):
+        # Open every batch produced by the sale date
+        while next_batch < len(batches) and batches[next_batch][1] <= sale_date:
+            batch_id, production_date, expiry_date, _ = batches[next_batch]
+            heapq.heappush(open_batches, (expiry_date, production_date, batch_id))
+            next_batch += 1
+
+        # Batches that expired before the sale keep what is left in them
+        while open_batches and open_batches[0][0] < sale_date:
+            heapq.heappop(open_batches)
+
+        while quantity > 0 and open_batches:
+            batch_id = open_batches[0][2]
+            taken = min(quantity, remaining[batch_id])
+            if taken > 0:
+                remaining[batch_id] -= taken
+                quantity -= taken
+                allocations.append((sale_id, batch_id, taken))
+            if remaining[batch_id] <= 0:
+                heapq.heappop(open_batches)
+
+    return remaining, allocations
@@ -0,0 +1,101 @@
+"""Query result cache shared by all sessions of a process
+
+Read queries are cached by their SQL text and parameters for a limited
+time and tagged with the tables they read. Write paths call invalidate()
+with the tables they changed after committing, which drops every cached
+result that depends on them. Writes committed by other processes reach
+invalidate() through app/database/invalidation.py.
+"""
+import threading
+import time
+
+DEFAULT_TTL = 300  # seconds
+MAX_ENTRIES = 1000
+
+_lock = threading.Lock()
+_entries = {}   # key -> (expires_at, tables, rows)
+_tagged = {}    # table -> set of keys
+_versions = {}  # table -> invalidation counter
+_generation = 0  # bumped by clear_cache, invalidating every table at once
+
+def _freeze(value):
+    """Make query parameters hashable"""
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+def _drop(key):
+    """Remove a cache entry and its tag references (lock must be held)"""
+    entry = _entries.pop(key, None)
+    if entry:
+        for table in entry[1]:
+            _tagged.get(table, set()).discard(key)
+
+def _prune(now):
+    """Evict expired entries, then the oldest ones if still over the limit"""
+    for key in [k for k, e in _entries.items() if e[0] <= now]:
+        _drop(key)
+    while len(_entries) >= MAX_ENTRIES:
+        _drop(next(iter(_entries)))
+
+def _table_versions(tables):
+    """Versions of the given tables, for detecting invalidations (lock must be held)"""
+    return _generation, tuple(_versions.get(table, 0) for table in tables)
+
+def table_version(table):
+    """Get the version of a table for caches kept elsewhere; it changes
+    whenever the table is invalidated or the whole cache is cleared"""
+    with _lock:
+        return _table_versions((table,))
+
+def cached_fetchall(db, query, params=None, tables=(), ttl=DEFAULT_TTL):
+    """Execute a read query and return all rows, reusing a cached result
+
+    The result is reused until the TTL expires or one of the given tables
+    is invalidated.
+    """
+    # select() constructs carry their bound values in the compiled statement
+    compiled = query.compile()
+    key = (str(compiled), _freeze(compiled.params), _freeze(params or {}))
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] > now:
+            return entry[2]
+        versions = _table_versions(tables)
+
+    rows = db.execute(query, params or {}).fetchall()
+
+    with _lock:
+        # Don't store a result that a concurrent write has already made stale
+        if versions == _table_versions(tables):
+            _drop(key)
+            _prune(now)
+            _entries[key] = (now + ttl, tuple(tables), rows)
+            for table in tables:
+                _tagged.setdefault(table, set()).add(key)
+    return rows
+
+def cached_fetchone(db, query, params=None, tables=(), ttl=DEFAULT_TTL):
+    """Execute a read query and return the first row, reusing a cached result"""
+    rows = cached_fetchall(db, query, params, tables, ttl)
+    return rows[0] if rows else None
+
+def invalidate(*tables):
+    """Drop all cached results that read from any of the given tables"""
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+            for key in list(_tagged.get(table, ())):
+                _drop(key)
+
+def clear_cache():
+    """Drop every cached result and invalidate every table, including ones
+    with nothing cached yet and the caches kept elsewhere"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _entries.clear()
+        _tagged.clear()
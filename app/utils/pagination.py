@@ -0,0 +1,77 @@
+"""Keyset-paginated browsing of result grids
+
+A browser keeps the keyset cursor of every page it has shown in
+st.session_state. Each page is read as "the next N rows after this
+cursor" from an index, so a deep page costs the same as the first one,
+and Previous reuses the cursor of the page before. While a page is shown,
+the next one is fetched into the query cache on a background thread, so
+Next is usually served from memory.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from app.database.connection import db_session
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+_prefetcher = ThreadPoolExecutor(max_workers=2)
+
+def _plain(value):
+    """Convert pandas and numpy scalars to types the database driver accepts"""
+    if hasattr(value, "to_pydatetime"):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+def _prefetch(fetch, after, limit):
+    with db_session() as db:
+        fetch(db, after, limit)
+
+def keyset_browser(db, key, fetch, cursor_columns, total_rows, filters=()):
+    """Show page controls for a newest-first result and return the current page
+
+    fetch(db, after, limit) returns a DataFrame of at most limit rows that
+    come after the cursor after (None for the first page). cursor_columns
+    name the frame columns that make up a cursor, matching the sort order.
+    total_rows is shown in the caption; pass None for lists that would need
+    a full count, such as the recent entries. The browser goes back to the first page when filters or the page size
+    change.
+    """
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 3])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+
+    scope = (tuple(filters), page_size)
+    if st.session_state.get(f"{key}_scope") != scope:
+        st.session_state[f"{key}_scope"] = scope
+        st.session_state[f"{key}_cursors"] = [None]
+        st.session_state[f"{key}_prefetched"] = None
+    cursors = st.session_state[f"{key}_cursors"]
+
+    # One extra row tells whether there is a next page
+    rows = fetch(db, cursors[-1], page_size + 1)
+    has_next = len(rows) > page_size
+    rows = rows.iloc[:page_size]
+    next_cursor = None
+    if has_next:
+        next_cursor = tuple(_plain(rows.iloc[-1][column]) for column in cursor_columns)
+        # Reruns of the same page don't fetch its next page again; only the
+        # last cursor is kept, so the state does not grow with browsing
+        if st.session_state[f"{key}_prefetched"] != next_cursor:
+            st.session_state[f"{key}_prefetched"] = next_cursor
+            _prefetcher.submit(_prefetch, fetch, next_cursor, page_size + 1)
+
+    page = len(cursors)
+    first_row = (page - 1) * page_size + 1
+    with col2:
+        st.button("Previous", key=f"{key}_previous", disabled=page == 1,
+                  on_click=cursors.pop)
+    with col3:
+        st.button("Next", key=f"{key}_next", disabled=not has_next,
+                  on_click=cursors.append, args=(next_cursor,))
+    with col4:
+        rows_shown = f"rows {first_row}-{first_row + len(rows) - 1}"
+        if total_rows is not None:
+            rows_shown += f" of {total_rows}"
+        st.caption(f"Page {page}: {rows_shown}")
+    return rows
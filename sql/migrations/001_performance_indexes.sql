@@ -0,0 +1,27 @@
+-- Indexes for the sales and inventory access paths used by the
+-- Overview, Reports, Orders and Production pages
+
+-- Orders filtered by product and date (stock projection, usage checks)
+CREATE INDEX IF NOT EXISTS idx_sales_product_date
+    ON sales (product_id, sale_date);
+
+-- Orders filtered by customer and date (order search, recent orders)
+CREATE INDEX IF NOT EXISTS idx_sales_customer_date
+    ON sales (customer_id, sale_date);
+
+-- Date range scans across all orders (revenue, reports)
+CREATE INDEX IF NOT EXISTS idx_sales_sale_date
+    ON sales (sale_date);
+
+-- Production filtered by product and date (stock projection, usage checks)
+CREATE INDEX IF NOT EXISTS idx_inventory_product_production_date
+    ON inventory (product_id, production_date);
+
+-- Date range scans across all production (projection, production search)
+CREATE INDEX IF NOT EXISTS idx_inventory_production_date
+    ON inventory (production_date);
+
+-- Batches still holding stock, by expiry (expiry alerts)
+CREATE INDEX IF NOT EXISTS idx_inventory_expiry_date_in_stock
+    ON inventory (expiry_date)
+    WHERE quantity > 0;
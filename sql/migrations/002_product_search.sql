@@ -0,0 +1,11 @@
+-- Trigram index for substring product search on ID, name, description
+-- and category (see app/database/product_search.py)
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_trgm
+    ON products USING GIN (
+        (CAST(id AS TEXT) || ' ' || name || ' ' ||
+         COALESCE(description, '') || ' ' || COALESCE(category, ''))
+        gin_trgm_ops
+    );
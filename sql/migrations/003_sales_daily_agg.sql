@@ -0,0 +1,38 @@
+-- Daily sales aggregate per product and customer, maintained by the
+-- order write paths (see app/database/aggregates.py). Orders without a
+-- customer are kept under customer_id 0 so that they share one upsert key.
+
+CREATE TABLE IF NOT EXISTS sales_daily_agg (
+    sale_day DATE NOT NULL,
+    product_id INTEGER NOT NULL,
+    customer_id INTEGER NOT NULL DEFAULT 0,
+    category VARCHAR,
+    order_lines INTEGER NOT NULL DEFAULT 0,
+    quantity DECIMAL(14,2) NOT NULL DEFAULT 0,
+    revenue DECIMAL(16,2) NOT NULL DEFAULT 0,
+    cogs DECIMAL(16,2) NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sales_daily_agg_key
+    ON sales_daily_agg (sale_day, product_id, customer_id);
+
+CREATE INDEX IF NOT EXISTS idx_sales_daily_agg_product
+    ON sales_daily_agg (product_id);
+
+-- Backfill from existing orders
+TRUNCATE sales_daily_agg;
+
+INSERT INTO sales_daily_agg
+    (sale_day, product_id, customer_id, category, order_lines, quantity, revenue, cogs)
+SELECT
+    s.sale_date::date,
+    s.product_id,
+    COALESCE(s.customer_id, 0),
+    p.category,
+    COUNT(*),
+    SUM(s.quantity),
+    SUM(s.quantity * s.price_per_unit),
+    SUM(s.quantity * COALESCE(p.base_price, 0))
+FROM sales s
+JOIN products p ON s.product_id = p.id
+GROUP BY s.sale_date::date, s.product_id, COALESCE(s.customer_id, 0), p.category;
@@ -0,0 +1,10 @@
+-- API keys for the JSON API (see app/routes/auth.py). Only a salted
+-- scrypt hash of each key's secret is stored.
+
+CREATE TABLE IF NOT EXISTS api_keys (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    key_hash VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    revoked_at TIMESTAMP
+);
@@ -0,0 +1,14 @@
+-- Keyset pagination of the order and production browsers walks
+-- (date, id) in descending order. These composite indexes serve that and
+-- every date range scan the single-column date indexes served, so those
+-- are replaced.
+
+CREATE INDEX IF NOT EXISTS idx_sales_sale_date_id
+    ON sales (sale_date, id);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_production_date_id
+    ON inventory (production_date, id);
+
+DROP INDEX IF EXISTS idx_sales_sale_date;
+
+DROP INDEX IF EXISTS idx_inventory_production_date;
@@ -0,0 +1,26 @@
+-- Order count and revenue per customer, maintained by the order write
+-- paths together with sales_daily_agg (see app/database/aggregates.py)
+
+CREATE TABLE IF NOT EXISTS customer_sales_rollup (
+    customer_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+    order_lines INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(16,2) NOT NULL DEFAULT 0
+);
+
+-- Backfill from existing orders
+TRUNCATE customer_sales_rollup;
+
+INSERT INTO customer_sales_rollup (customer_id, order_lines, revenue)
+SELECT customer_id, COUNT(*), SUM(quantity * price_per_unit)
+FROM sales
+WHERE customer_id IS NOT NULL
+GROUP BY customer_id;
+
+-- Trigram indexes for substring customer search on name and contact info
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_customers_name_trgm
+    ON customers USING GIN (name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_customers_contact_info_trgm
+    ON customers USING GIN (contact_info gin_trgm_ops);
@@ -0,0 +1,18 @@
+-- Number of order lines and production batches per product, maintained by
+-- the order and production write paths (see app/database/aggregates.py)
+
+CREATE TABLE IF NOT EXISTS product_usage (
+    product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    sales_count INTEGER NOT NULL DEFAULT 0,
+    production_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Backfill from existing orders and production
+TRUNCATE product_usage;
+
+INSERT INTO product_usage (product_id, sales_count, production_count)
+SELECT
+    p.id,
+    (SELECT COUNT(*) FROM sales s WHERE s.product_id = p.id),
+    (SELECT COUNT(*) FROM inventory i WHERE i.product_id = p.id)
+FROM products p;
@@ -0,0 +1,54 @@
+-- Stock movements and running stock balances, maintained by the order and
+-- production write paths (see app/database/stock.py)
+
+-- One signed entry per stock movement: production adds stock on its
+-- production date, an order line removes it on its sale date. Edits and
+-- deletes append reversing entries.
+CREATE TABLE IF NOT EXISTS stock_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    unit VARCHAR(20) NOT NULL,
+    event_date DATE NOT NULL,
+    quantity DECIMAL(14,2) NOT NULL,
+    source VARCHAR(10) NOT NULL CHECK (source IN ('production', 'sale')),
+    source_id INTEGER NOT NULL,
+    recorded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- One row per product, unit and day with movements; balance is the stock
+-- at the end of that day
+CREATE TABLE IF NOT EXISTS stock_balance (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    unit VARCHAR(20) NOT NULL,
+    balance_date DATE NOT NULL,
+    produced DECIMAL(14,2) NOT NULL DEFAULT 0,
+    sold DECIMAL(14,2) NOT NULL DEFAULT 0,
+    balance DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, unit, balance_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_balance_date
+    ON stock_balance (balance_date);
+
+-- Backfill from existing production and orders
+TRUNCATE stock_ledger, stock_balance;
+
+INSERT INTO stock_ledger (product_id, unit, event_date, quantity, source, source_id)
+SELECT product_id, unit, production_date, quantity, 'production', id
+FROM inventory
+WHERE product_id IS NOT NULL
+UNION ALL
+SELECT product_id, unit, sale_date::date, -quantity, 'sale', id
+FROM sales
+WHERE product_id IS NOT NULL;
+
+INSERT INTO stock_balance (product_id, unit, balance_date, produced, sold, balance)
+SELECT
+    product_id,
+    unit,
+    event_date,
+    COALESCE(SUM(quantity) FILTER (WHERE source = 'production'), 0),
+    COALESCE(-SUM(quantity) FILTER (WHERE source = 'sale'), 0),
+    SUM(SUM(quantity)) OVER (PARTITION BY product_id, unit ORDER BY event_date)
+FROM stock_ledger
+GROUP BY product_id, unit, event_date;
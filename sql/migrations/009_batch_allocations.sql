@@ -0,0 +1,35 @@
+-- Stock left in each production batch and the order lines that drew on
+-- it, maintained by the order and production write paths (see
+-- app/database/batches.py)
+
+ALTER TABLE inventory
+    ADD COLUMN IF NOT EXISTS remaining_quantity DECIMAL(10,2) NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS batch_allocations (
+    sale_id INTEGER NOT NULL REFERENCES sales(id) ON DELETE CASCADE,
+    batch_id INTEGER NOT NULL REFERENCES inventory(id) ON DELETE CASCADE,
+    quantity DECIMAL(10,2) NOT NULL,
+    PRIMARY KEY (sale_id, batch_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_batch_allocations_batch
+    ON batch_allocations (batch_id);
+
+-- Batches still holding stock, by expiry (expiry views); replaces the
+-- index on the full batch quantity
+CREATE INDEX IF NOT EXISTS idx_inventory_expiry_date_remaining
+    ON inventory (expiry_date)
+    WHERE remaining_quantity > 0;
+
+DROP INDEX IF EXISTS idx_inventory_expiry_date_in_stock;
+
+-- Open batches of a product (allocation)
+CREATE INDEX IF NOT EXISTS idx_inventory_product_expiry_remaining
+    ON inventory (product_id, expiry_date)
+    WHERE remaining_quantity > 0;
+
+-- Every batch starts full. Existing order lines are allocated afterwards
+-- with python -m app.database.aggregates --allocations, which works
+-- through the products a group at a time in short transactions instead of
+-- holding this migration's transaction open over the whole order history
+UPDATE inventory SET remaining_quantity = quantity;
@@ -0,0 +1,24 @@
+-- Nightly per-product weekly stock projections, written by
+-- python -m app.database.projections --snapshot. Pages read the latest
+-- snapshot of the day and apply the stock_ledger entries recorded after it.
+
+CREATE TABLE IF NOT EXISTS projection_snapshots (
+    id SERIAL PRIMARY KEY,
+    as_of DATE NOT NULL,
+    num_weeks INTEGER NOT NULL,
+    -- Last stock_ledger entry included in the snapshot
+    ledger_id BIGINT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_projection_snapshots_as_of
+    ON projection_snapshots (as_of, num_weeks, id);
+
+-- Stock at the end of as_of and at the end of each projected week
+CREATE TABLE IF NOT EXISTS projection_snapshot_rows (
+    snapshot_id INTEGER NOT NULL REFERENCES projection_snapshots(id) ON DELETE CASCADE,
+    product_id INTEGER NOT NULL,
+    opening_stock DECIMAL(14,2) NOT NULL,
+    weekly_stock DECIMAL(14,2)[] NOT NULL,
+    PRIMARY KEY (snapshot_id, product_id)
+);
@@ -0,0 +1,43 @@
+-- Cross-process invalidation of the query result cache (app/utils/helpers.py).
+-- Every write to a table the cache reads notifies the channel
+-- cache_invalidation with the table name. Notifications are delivered when
+-- the writing transaction commits, once per table, and each app and API
+-- process listens for them (see app/database/invalidation.py). Writes made
+-- outside the app, such as bulk imports in SQL, notify as well.
+
+CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('cache_invalidation', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS categories_cache_invalidation ON categories;
+CREATE TRIGGER categories_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON categories
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS products_cache_invalidation ON products;
+CREATE TRIGGER products_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS customers_cache_invalidation ON customers;
+CREATE TRIGGER customers_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON customers
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS inventory_cache_invalidation ON inventory;
+CREATE TRIGGER inventory_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON inventory
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS sales_cache_invalidation ON sales;
+CREATE TRIGGER sales_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON sales
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS projection_snapshots_cache_invalidation ON projection_snapshots;
+CREATE TRIGGER projection_snapshots_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON projection_snapshots
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation();
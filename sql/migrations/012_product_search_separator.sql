@@ -0,0 +1,14 @@
+-- Join the searched product fields with a newline instead of a space, so
+-- that a (single line) search term cannot match across the end of one
+-- field and the start of the next. The in-memory catalog search in
+-- app/utils/catalog.py joins them the same way. The expression must stay
+-- identical to SEARCH_DOCUMENT in app/database/product_search.py.
+
+DROP INDEX IF EXISTS idx_products_search_trgm;
+
+CREATE INDEX idx_products_search_trgm
+    ON products USING GIN (
+        (CAST(id AS TEXT) || E'\n' || name || E'\n' ||
+         COALESCE(description, '') || E'\n' || COALESCE(category, ''))
+        gin_trgm_ops
+    );
@@ -0,0 +1,61 @@
+"""Fixtures for tests that run against the PostgreSQL database in .env
+
+The database must have the migrations applied (python -m app.database.migrate).
+Every test runs in a transaction that is rolled back afterwards; commits
+made by the code under test only release a savepoint inside it. Tests
+that need the database are skipped when it cannot be reached.
+"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.database.connection import create_db_engine
+from app.utils.helpers import clear_cache
+
+@pytest.fixture(scope="session")
+def engine():
+    engine = create_db_engine(application_name="inventory-tests", pool_size=1, max_overflow=0)
+    try:
+        with engine.connect():
+            pass
+    except OperationalError as e:
+        pytest.skip(f"Database not available: {e}")
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    """A session whose changes are rolled back after the test"""
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    clear_cache()
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+        clear_cache()
+
+@pytest.fixture
+def product(db):
+    """Id of a new product with a 30-day shelf life"""
+    db.execute(text("""
+        INSERT INTO categories (name) VALUES ('Test category')
+        ON CONFLICT (name) DO NOTHING
+    """))
+    return db.execute(text("""
+        INSERT INTO products (id, name, category, description, base_price, days_to_expiration)
+        SELECT COALESCE(MAX(id), 0) + 1, 'Test product', 'Test category', 'Test IPA', 2.50, 30
+        FROM products
+        RETURNING id
+    """)).scalar()
+
+@pytest.fixture
+def customer(db):
+    """Id of a new customer"""
+    return db.execute(text("""
+        INSERT INTO customers (name, contact_info) VALUES ('Test customer', 'test@example.com')
+        RETURNING id
+    """)).scalar()
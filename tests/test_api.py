@@ -0,0 +1,189 @@
+"""JSON API endpoints, served in-process against the test transaction"""
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import json
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from tornado.testing import AsyncHTTPTestCase
+from app.database.production import record_production
+from app.pages.overview import get_stock_matrix
+from app.routes import api
+from app.routes.auth import clear_auth_cache, create_api_key
+
+@pytest.fixture
+def api_db(db, monkeypatch):
+    """Serve API requests with the test session, and get a valid token"""
+    @contextmanager
+    def session():
+        yield db
+    monkeypatch.setattr(api, "db_session", session)
+    clear_auth_cache()
+    yield create_api_key(db, "test")
+    clear_auth_cache()
+
+class APITestCase(AsyncHTTPTestCase):
+    @pytest.fixture(autouse=True)
+    def _api(self, api_db, db, product, customer, monkeypatch):
+        self.token = api_db
+        self.monkeypatch = monkeypatch
+        self.db = db
+        self.product = product
+        self.customer = customer
+
+    def get_app(self):
+        return api.make_app()
+
+    def request(self, path, token=None, **kwargs):
+        """Fetch path with the test token; returns (status, JSON body)"""
+        headers = kwargs.pop("headers", {})
+        headers["Authorization"] = f"Bearer {token or self.token}"
+        response = self.fetch(path, headers=headers, **kwargs)
+        return response.code, json.loads(response.body) if response.body else None
+
+    def produce(self, quantity, produced, expires):
+        record_production(self.db, [{
+            "product_id": self.product, "quantity": quantity, "unit": "L",
+            "production_date": produced, "expiry_date": expires
+        }])
+        self.db.commit()
+
+def _fail(*args):
+    raise OperationalError("SELECT", {}, Exception("connection lost"))
+
+class StockTest(APITestCase):
+    def test_page_after_cursor(self):
+        self.produce(10, date.today() - timedelta(days=1), date.today() + timedelta(days=30))
+
+        status, body = self.request(f"/api/stock?cursor={self.product - 1}&limit=1")
+        assert status == 200
+        assert [item["product_id"] for item in body["items"]] == [self.product]
+        assert body["items"][0]["current_stock"] == 10
+        assert body["next_cursor"] is None
+
+        status, body = self.request(f"/api/stock?cursor={self.product}")
+        assert status == 200
+        assert body["items"] == [] and body["next_cursor"] is None
+
+    def test_next_cursor_continues_the_listing(self):
+        status, first = self.request("/api/stock?limit=1")
+        assert status == 200
+        assert len(first["items"]) == 1
+        status, rest = self.request(f"/api/stock?cursor={first['next_cursor']}&limit={api.MAX_LIMIT}")
+        ids = [item["product_id"] for item in first["items"] + rest["items"]]
+        assert ids == sorted(ids)
+        assert ids[-1] == self.product
+
+    def test_database_error_is_a_server_error(self):
+        self.monkeypatch.setattr(api, "get_stock_levels", _fail)
+        status, body = self.request("/api/stock")
+        assert status == 500
+        assert "error" in body
+
+class ProjectionTest(APITestCase):
+    def test_projection_of_one_product(self):
+        self.produce(10, date.today() + timedelta(days=7), date.today() + timedelta(days=37))
+
+        status, body = self.request(f"/api/projection?weeks=4&cursor={self.product - 1}")
+        assert status == 200
+        assert len(body["weeks"]) == 4
+        [item] = body["items"]
+        assert item["product_id"] == self.product
+        assert item["current_stock"] == 0
+        assert item["levels"][-1] == 10
+
+    def test_weeks_match_the_overview_page(self):
+        produced = date.today() + timedelta(days=7)
+        self.produce(10, produced, produced + timedelta(days=30))
+
+        status, body = self.request(f"/api/projection?weeks=3&cursor={self.product - 1}")
+        assert status == 200
+        monday = date.today() - timedelta(days=date.today().weekday())
+        assert body["week_starts"] == [(monday + timedelta(weeks=w)).isoformat() for w in range(3)]
+
+        matrix = get_stock_matrix(self.db, date.today(), periods=3, granularity="week")
+        row = matrix[matrix['Product ID'] == str(self.product)].iloc[0]
+        assert body["weeks"] == list(matrix.columns[4:])
+        assert body["items"][0]["levels"] == [row[week] for week in body["weeks"]]
+        assert body["items"][0]["levels"] == [0, 10, 10]
+
+    def test_database_error_is_a_server_error(self):
+        self.monkeypatch.setattr(api, "get_stock_levels", _fail)
+        assert self.request("/api/projection")[0] == 500
+
+class ExpiryTest(APITestCase):
+    def test_expiring_stock(self):
+        self.produce(10, date.today() - timedelta(days=20), date.today() + timedelta(days=3))
+
+        status, body = self.request("/api/expiry?weeks=2")
+        assert status == 200
+        products = [p for week in body["weeks"] for p in week["products"]
+                    if p["Product ID"] == str(self.product)]
+        assert [p["Quantity"] for p in products] == ["10.00 L"]
+
+    def test_database_error_is_a_server_error(self):
+        self.monkeypatch.setattr(api, "expiry_buckets", _fail)
+        assert self.request("/api/expiry")[0] == 500
+
+class OrdersTest(APITestCase):
+    def order(self, **item):
+        line = {"product_id": self.product, "quantity": 10, "unit": "L", "price_per_unit": 4.5}
+        line.update(item)
+        return self.request("/api/orders", method="POST",
+                            body=json.dumps({"customer_id": self.customer, "items": [line]}))
+
+    def test_create_order(self):
+        status, body = self.order()
+        assert status == 201
+        status, orders = self.request(f"/api/orders?product_id={self.product}")
+        assert [o["id"] for o in orders["items"]] == body["sale_ids"]
+
+    def test_pages_through_lines_without_a_date(self):
+        ids = [self.db.execute(text("""
+            INSERT INTO sales (customer_id, product_id, quantity, unit, price_per_unit, sale_date)
+            VALUES (:customer_id, :product_id, 1, 'L', 2, :sale_date)
+            RETURNING id
+        """), {"customer_id": self.customer, "product_id": self.product, "sale_date": sale_date}
+        ).scalar() for sale_date in (None, datetime(2026, 1, 5), None)]
+        self.db.commit()
+
+        seen, cursor = [], None
+        for _ in range(4):
+            path = f"/api/orders?product_id={self.product}&limit=1"
+            status, body = self.request(path + (f"&cursor={cursor}" if cursor else ""))
+            assert status == 200
+            seen += [item["id"] for item in body["items"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        # Lines without a date first, newest id first, then by date
+        assert seen == [ids[2], ids[0], ids[1]]
+
+    def test_rejects_malformed_items(self):
+        for item in ({"product_id": 1.9}, {"product_id": True}, {"product_id": "1"},
+                     {"unit": 5}, {"unit": ""}, {"unit": "x" * 21}):
+            assert self.order(**item)[0] == 400, item
+
+    def test_rejects_quantities_that_are_not_finite(self):
+        for value in ("NaN", "Infinity", "-Infinity", 0, -1):
+            assert self.order(quantity=value)[0] == 400, value
+            assert self.order(price_per_unit=value)[0] == 400, value
+
+class HealthTest(APITestCase):
+    def test_health_reports_pool(self):
+        status, body = self.request("/api/health")
+        assert status == 200
+        assert body["database"] == "ok"
+        assert {"checkouts", "avg_wait", "max_wait", "pool_size", "checked_out"} <= set(body["pool"])
+
+    def test_health_requires_a_key(self):
+        response = self.fetch("/api/health")
+        assert response.code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    def test_failed_token_is_throttled(self):
+        assert self.request("/api/health", token=self.token + "x")[0] == 401
+        response = self.fetch("/api/health", headers={"Authorization": f"Bearer {self.token}x"})
+        assert response.code == 429
+        assert response.headers["Retry-After"] == str(api.AUTH_FAILURE_WINDOW)
+        assert self.request("/api/health")[0] == 200
@@ -0,0 +1,60 @@
+"""API key verification: latency of the hash and the cache, and throttling"""
+import pytest
+from app.routes import auth
+from app.routes.auth import authenticate, benchmark, clear_auth_cache, create_api_key
+
+@pytest.fixture
+def token(db):
+    clear_auth_cache()
+    yield create_api_key(db, "test")
+    clear_auth_cache()
+
+@pytest.fixture
+def verifications(monkeypatch):
+    """Count the hash verifications"""
+    calls = []
+    verify = auth.verify_secret
+    def counting(secret, key_hash):
+        calls.append(secret)
+        return verify(secret, key_hash)
+    monkeypatch.setattr(auth, "verify_secret", counting)
+    return calls
+
+def test_verification_latency(record_property):
+    hash_ms, cached_ms = benchmark(rounds=1000)
+    record_property("hash_ms", hash_ms)
+    record_property("cached_ms", cached_ms)
+    # The hash is deliberately slow; a cached token must cost next to nothing
+    assert hash_ms > 1
+    assert cached_ms < 0.1
+    assert cached_ms * 100 < hash_ms
+
+def test_verified_token_is_cached(db, token, verifications):
+    key_id = int(token.split(".")[0])
+    assert authenticate(db, token) == key_id
+    assert authenticate(db, token) == key_id
+    assert len(verifications) == 1
+
+def test_failed_token_is_not_verified_again(db, token, verifications):
+    bad = token + "x"
+    assert authenticate(db, bad) is None
+    assert auth.is_throttled(bad)
+    assert authenticate(db, bad) is None
+    assert len(verifications) == 1
+    # Other tokens of the key still work
+    assert authenticate(db, token) is not None
+
+def test_client_throttled_after_repeated_failures(db, token, verifications, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_MAX_FAILURES", 3)
+    for attempt in range(3):
+        assert authenticate(db, f"{token}{attempt}", client="10.0.0.1") is None
+    assert len(verifications) == 3
+
+    # Nothing more is checked for that client while it is throttled
+    assert auth.is_throttled(f"{token}x", client="10.0.0.1")
+    assert authenticate(db, f"{token}x", client="10.0.0.1") is None
+    assert len(verifications) == 3
+
+    # The key itself is not locked: other clients still get in with it
+    assert not auth.is_throttled(token, client="10.0.0.2")
+    assert authenticate(db, token, client="10.0.0.2") is not None
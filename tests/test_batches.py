@@ -0,0 +1,43 @@
+"""Re-allocating order lines to production batches"""
+from datetime import date, timedelta
+from sqlalchemy import text
+from app.database.batches import rebuild_allocations
+from app.database.orders import record_order
+from app.database.production import record_production
+
+def _state(db, product):
+    allocations = db.execute(text("""
+        SELECT a.sale_id, a.batch_id, a.quantity
+        FROM batch_allocations a
+        JOIN inventory i ON i.id = a.batch_id
+        WHERE i.product_id = :product_id
+        ORDER BY a.sale_id, a.batch_id
+    """), {"product_id": product}).fetchall()
+    remaining = db.execute(text("""
+        SELECT id, remaining_quantity FROM inventory
+        WHERE product_id = :product_id
+        ORDER BY id
+    """), {"product_id": product}).fetchall()
+    return allocations, remaining
+
+def test_rebuild_by_product_matches_full_rebuild(db, product, customer):
+    start = date.today() - timedelta(days=20)
+    record_production(db, [
+        {"product_id": product, "quantity": quantity, "unit": "L",
+         "production_date": start + timedelta(days=offset),
+         "expiry_date": start + timedelta(days=offset + 15)}
+        for offset, quantity in [(0, 10), (2, 8), (5, 12)]
+    ])
+    # Entered out of date order, so the maintained allocations differ from
+    # a rebuild in date order
+    for offset, quantity in [(9, 6), (3, 7), (6, 9)]:
+        record_order(db, customer, start + timedelta(days=offset), [
+            {"product_id": product, "quantity": quantity, "unit": "L", "price_per_unit": 2}
+        ])
+
+    rebuild_allocations(db, [product])
+    by_product = _state(db, product)
+    rebuild_allocations(db)
+
+    assert by_product == _state(db, product)
+    assert sum(a.quantity for a in by_product[0]) == 6 + 7 + 9
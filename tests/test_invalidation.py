@@ -0,0 +1,70 @@
+"""Cached results are dropped when another process commits a write"""
+import threading
+import time
+from sqlalchemy import text
+from app.database.invalidation import listen_for_invalidations
+from app.utils.catalog import get_catalog
+from app.utils.helpers import cached_fetchall, clear_cache, table_version
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_committed_write_invalidates_cached_table(engine):
+    connected = table_version("categories")
+    stop = threading.Event()
+    listener = threading.Thread(
+        target=listen_for_invalidations, args=(engine, stop), kwargs={"poll_seconds": 0.1}
+    )
+    listener.start()
+    try:
+        # The listener clears the cache, bumping the version, once it listens
+        assert _wait_for(lambda: table_version("categories") != connected)
+        before = table_version("categories")
+
+        # A write that is rolled back sends nothing
+        with engine.connect() as conn:
+            conn.execute(text("UPDATE categories SET name = name WHERE FALSE"))
+            conn.rollback()
+        time.sleep(0.5)
+        assert table_version("categories") == before
+
+        # Statement triggers fire even when no rows change, so this commit
+        # notifies without changing any data
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE categories SET name = name WHERE FALSE"))
+        assert _wait_for(lambda: table_version("categories") != before)
+    finally:
+        stop.set()
+        listener.join()
+
+def test_clear_cache_invalidates_tables_with_nothing_cached(db):
+    before = table_version("never_cached")
+    clear_cache()
+    assert table_version("never_cached") != before
+
+def test_clear_cache_reloads_the_catalog(db):
+    catalog = get_catalog(db)
+    assert get_catalog(db) is catalog
+    clear_cache()
+    assert get_catalog(db) is not catalog
+
+def test_result_read_while_cache_is_cleared_is_not_stored(db):
+    class ClearingSession:
+        """Clears the cache while the query runs, as the listener would"""
+        executed = 0
+
+        def execute(self, query, params):
+            self.executed += 1
+            clear_cache()
+            return db.execute(query, params)
+
+    session = ClearingSession()
+    query = text("SELECT 1")
+    cached_fetchall(session, query, tables=("never_cached",))
+    cached_fetchall(session, query, tables=("never_cached",))
+    assert session.executed == 2
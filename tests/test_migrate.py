@@ -0,0 +1,7 @@
+"""The migrate --check EXPLAIN set"""
+from app.database.migrate import check_index_usage
+
+def test_every_index_check_explains(engine):
+    results = check_index_usage(engine, force_index=True)
+    assert results
+    assert [r["check"] for r in results if r.get("error")] == []
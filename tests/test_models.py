@@ -0,0 +1,35 @@
+"""Order and production lists without date bounds, as the recent-entry lists page them"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+from app.database.models import production_frame, sales_frame
+from app.database.production import record_production
+
+def _sale(db, product, customer, sale_date):
+    return db.execute(text("""
+        INSERT INTO sales (customer_id, product_id, quantity, unit, price_per_unit, sale_date)
+        VALUES (:customer_id, :product_id, 1, 'L', 2, :sale_date)
+        RETURNING id
+    """), {"customer_id": customer, "product_id": product, "sale_date": sale_date}).scalar()
+
+def test_recent_sales_page_without_date_bounds(db, product, customer):
+    older = _sale(db, product, customer, datetime(2020, 1, 1))
+    newer = _sale(db, product, customer, datetime(2021, 1, 1))
+    _sale(db, product, customer, None)
+
+    first = sales_frame(db, None, None, customer_id=customer, limit=1)
+    assert first["id"].tolist() == [newer]
+    after = (first["sale_date"].iloc[0].to_pydatetime(), int(first["id"].iloc[0]))
+    rest = sales_frame(db, None, None, customer_id=customer, after=after)
+    # Lines without a date cannot be paged by date and are left out
+    assert rest["id"].tolist() == [older]
+
+def test_recent_production_from_a_start_date(db, product):
+    today = date.today()
+    old, recent = record_production(db, [
+        {"product_id": product, "quantity": 1, "unit": "L",
+         "production_date": today - timedelta(days=40), "expiry_date": today},
+        {"product_id": product, "quantity": 1, "unit": "L",
+         "production_date": today + timedelta(days=400), "expiry_date": today + timedelta(days=430)},
+    ])
+    ids = production_frame(db, today - timedelta(days=30), None)["id"].tolist()
+    assert recent in ids and old not in ids
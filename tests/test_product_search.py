@@ -0,0 +1,18 @@
+"""Product search in SQL and in the in-memory catalog agree"""
+from app.database.product_search import find_products
+from app.utils.catalog import get_catalog
+
+def _ids(products):
+    return [p.id for p in products]
+
+def test_term_does_not_match_across_fields(db, product):
+    # "Test product" is followed by the description "Test IPA"
+    assert product not in _ids(find_products(db, "product test", limit=None))
+    assert product not in _ids(get_catalog(db).search("product test", limit=None))
+
+def test_sql_and_catalog_search_agree(db, product):
+    for term in ("test ipa", "Test category", str(product)):
+        sql = _ids(find_products(db, term, limit=None))
+        catalog = _ids(get_catalog(db).search(term, limit=None))
+        assert product in sql
+        assert sorted(sql) == sorted(catalog), term
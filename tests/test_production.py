@@ -0,0 +1,61 @@
+"""Editing and deleting production batches that orders have drawn on"""
+from datetime import date, timedelta
+from decimal import Decimal
+from sqlalchemy import text
+from app.database.orders import record_order
+from app.database.production import delete_production, record_production, update_production
+from app.database.stock import get_stock_balance
+
+def _allocations(db, sale_id):
+    rows = db.execute(text("""
+        SELECT batch_id, quantity FROM batch_allocations WHERE sale_id = :sale_id
+    """), {"sale_id": sale_id}).fetchall()
+    return {r.batch_id: r.quantity for r in rows}
+
+def _remaining(db, batch_id):
+    return db.execute(text("""
+        SELECT remaining_quantity FROM inventory WHERE id = :batch_id
+    """), {"batch_id": batch_id}).scalar()
+
+def _setup(db, product, customer):
+    """Two batches of the product, and an order line drawing on both"""
+    produced = date.today() - timedelta(days=10)
+    first, second = record_production(db, [
+        {"product_id": product, "quantity": 10, "unit": "L",
+         "production_date": produced, "expiry_date": produced + timedelta(days=20)},
+        {"product_id": product, "quantity": 20, "unit": "L",
+         "production_date": produced, "expiry_date": produced + timedelta(days=30)},
+    ])
+    [sale_id] = record_order(db, customer, date.today() - timedelta(days=5), [
+        {"product_id": product, "quantity": 15, "unit": "L", "price_per_unit": 2}
+    ])
+    assert _allocations(db, sale_id) == {first: 10, second: 5}
+    return first, second, sale_id
+
+def test_update_batch_with_allocated_sales(db, product, customer):
+    first, second, sale_id = _setup(db, product, customer)
+    produced = date.today() - timedelta(days=10)
+
+    update_production(db, first, 4, "L", produced, produced + timedelta(days=20))
+    db.commit()
+
+    assert _allocations(db, sale_id) == {first: 4, second: 11}
+    assert _remaining(db, first) == 0
+    assert _remaining(db, second) == 9
+    assert get_stock_balance(db, product, "L", date.today()) == Decimal(4 + 20 - 15)
+    assert db.execute(text("""
+        SELECT production_count FROM product_usage WHERE product_id = :product_id
+    """), {"product_id": product}).scalar() == 2
+
+def test_delete_batch_with_allocated_sales(db, product, customer):
+    first, second, sale_id = _setup(db, product, customer)
+
+    delete_production(db, first)
+    db.commit()
+
+    assert _allocations(db, sale_id) == {second: 15}
+    assert _remaining(db, second) == 5
+    assert get_stock_balance(db, product, "L", date.today()) == Decimal(20 - 15)
+    assert db.execute(text("""
+        SELECT production_count FROM product_usage WHERE product_id = :product_id
+    """), {"product_id": product}).scalar() == 1
@@ -0,0 +1,64 @@
+"""Regression tests for the revenue queries of the Overview page"""
+from datetime import date, datetime, time, timedelta
+import pytest
+from sqlalchemy import text
+from app.database.orders import record_order
+from app.pages.overview import get_daily_revenue_current_month, get_revenue_projection
+
+# The queries before the rewrite: months joined on DATE_TRUNC, and the
+# daily series grouped by the raw timestamp
+ORIGINAL_MONTHLY = text("""
+    WITH RECURSIVE months AS (
+        SELECT DATE_TRUNC('month', CURRENT_DATE) as month_start
+        UNION ALL
+        SELECT month_start + INTERVAL '1 month'
+        FROM months
+        WHERE month_start < DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '6 months'
+    )
+    SELECT months.month_start,
+           COALESCE(SUM(s.quantity * s.price_per_unit), 0) as revenue
+    FROM months
+    LEFT JOIN sales s ON DATE_TRUNC('month', s.sale_date) = months.month_start
+    GROUP BY months.month_start
+    ORDER BY months.month_start
+""")
+
+ORIGINAL_DAILY = text("""
+    SELECT sale_date::date, COALESCE(SUM(quantity * price_per_unit), 0) as revenue
+    FROM sales
+    WHERE DATE_TRUNC('month', sale_date) = DATE_TRUNC('month', CURRENT_DATE)
+    GROUP BY sale_date
+    ORDER BY sale_date
+""")
+
+def _order(db, customer, product, sale_date, quantity, price):
+    record_order(db, customer, sale_date, [{
+        "product_id": product, "quantity": quantity, "unit": "L", "price_per_unit": price
+    }])
+
+def test_daily_revenue_has_one_point_per_day(db, product, customer):
+    today = date.today()
+    _order(db, customer, product, datetime.combine(today, time(9, 15)), 10, 2)
+    _order(db, customer, product, datetime.combine(today, time(16, 40)), 5, 3)
+
+    original_days = [r.sale_date for r in db.execute(ORIGINAL_DAILY)]
+    assert original_days.count(today) >= 2
+
+    days, revenues = get_daily_revenue_current_month(db)
+    assert len(days) == len(set(days))
+    expected = db.execute(text("""
+        SELECT SUM(quantity * price_per_unit) FROM sales WHERE sale_date::date = :today
+    """), {"today": today}).scalar()
+    assert revenues[days.index(today)] == pytest.approx(float(expected))
+
+def test_monthly_revenue_matches_original_query(db, product, customer):
+    # Sales on both sides of a month boundary
+    next_month = (date.today().replace(day=1) + timedelta(days=32)).replace(day=1)
+    _order(db, customer, product, datetime.combine(next_month, time(0, 0)), 4, 5)
+    _order(db, customer, product, datetime.combine(next_month - timedelta(days=1), time(23, 59, 59)), 3, 7)
+
+    original = db.execute(ORIGINAL_MONTHLY).fetchall()
+    revenues = get_revenue_projection(db)
+
+    assert [label for label, _ in revenues] == [r.month_start.strftime("%b %Y") for r in original]
+    assert [revenue for _, revenue in revenues] == pytest.approx([float(r.revenue) for r in original])